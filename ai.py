@@ -1,6 +1,256 @@
 """Computer (AI) of the TicTacToe"""
-from position import Position
-from typing import Tuple
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+import batch
+from position import CLASSIC, Board, Geometry, Position
+from solved_table import SolvedTable, default_table
+from transposition import EXACT, LOWER_BOUND, UPPER_BOUND, TranspositionTable, canonical_key
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    # Only for the annotations, the modules import the AI or are slow to import
+    import pstats
+    from parallel import ParallelSearch
+    from ponder import Ponderer
+
+
+# Search horizon of the boards bigger than the classic board, where a
+# full search is not feasible
+LARGE_BOARD_DEPTH = 4
+
+# Seconds for each move on the boards bigger than the classic board when no
+# depth or budget is given, a fixed depth takes too long on the biggest ones
+LARGE_BOARD_TIME_LIMIT = 2.0
+
+# Seconds between two reads of the clock in the search, the work between them
+# follows its measured time, which grows a lot with the board
+CLOCK_CHECK_PERIOD = 0.002
+
+# Tables shared by all the AI instances of the process, one for each board
+# size, so a position is searched only once even across different calls and games.
+# They're created by get_shared_table when a board size is first used
+shared_tables: Dict[Geometry, TranspositionTable] = {}
+
+# File of the persistent cache and its limits, None to keep the tables only in memory
+_cache_settings: Optional[Dict[str, object]] = None
+# True once the settings are known, from enable_persistent_cache or from the
+# TICTACTOE_CACHE environment variable when the first table is created
+_cache_configured = False
+
+
+def enable_persistent_cache(path: str, max_entries: Optional[int] = None,
+                            min_depth: Optional[int] = None) -> None:
+    """Back the shared tables of the process with a file shared by many processes.
+
+    The tables created before are saved and replaced, so the next searches
+    start with the entries of the file.
+
+    Args:
+        path (str): The path of the file, it's created if it doesn't exist.
+        max_entries (int): The maximum number of entries of the file, by default 
+                           the one of persistent_table.
+        min_depth (int): The lowest depth of the entries written to the file, by 
+                         default the one of persistent_table.
+    """
+    global _cache_settings, _cache_configured
+    _cache_configured = True
+    for table in shared_tables.values():
+        table.flush()
+    shared_tables.clear()
+    _cache_settings = {"path": path}
+    if max_entries is not None:
+        _cache_settings["max_entries"] = max_entries
+    if min_depth is not None:
+        _cache_settings["min_depth"] = min_depth
+
+
+def new_table(geometry: Geometry) -> TranspositionTable:
+    """Create a transposition table, backed by the persistent cache if it's enabled.
+
+    The TICTACTOE_CACHE environment variable enables the cache the first time
+    a table is created, unless enable_persistent_cache was called before.
+
+    Args:
+        geometry (Geometry): The lines of the board.
+
+    Returns:
+        TranspositionTable: The new table.
+    """
+    global _cache_configured
+    if not _cache_configured and os.environ.get("TICTACTOE_CACHE"):
+        enable_persistent_cache(os.environ["TICTACTOE_CACHE"])
+    _cache_configured = True
+    if _cache_settings is not None:
+        # Imported only when the cache is used, SQLite is slow to import
+        from persistent_table import PersistentTable
+        return PersistentTable(geometry=geometry, **_cache_settings)
+    return TranspositionTable()
+
+
+def get_shared_table(geometry: Geometry) -> TranspositionTable:
+    """Get the transposition table shared in the process for a board size.
+
+    The table is created the first time the board size is used.
+
+    Args:
+        geometry (Geometry): The lines of the board.
+
+    Returns:
+        TranspositionTable: The shared table.
+    """
+    if geometry not in shared_tables:
+        shared_tables[geometry] = new_table(geometry)
+    return shared_tables[geometry]
+
+
+class SearchTimeout(Exception):
+    """Raised inside the search when the time or node budget is exhausted or it's stopped."""
+
+
+@dataclass
+class IterationStats:
+    """Result of one completed iteration of the iterative deepening.
+
+    Attributes
+    ----------
+    depth : int
+        The depth searched in the iteration.
+    value : float
+        The evaluation of the position.
+    move : int
+        The best move found.
+    principal_variation : List[int]
+        The moves expected from both players after the best move.
+    nodes : int
+        The nodes visited in the iteration.
+    elapsed : float
+        The seconds spent in the iteration.
+    """
+    depth: int
+    value: float
+    move: int
+    principal_variation: List[int]
+    nodes: int
+    elapsed: float
+
+
+@dataclass
+class SearchStats:
+    """Statistics of the search of one move.
+
+    Attributes
+    ----------
+    source : str
+        How the move was chosen: 'solved_table', 'minimax', 'mtdf', 
+        'iterative_deepening', 'parallel', 'ponder' or 'mcts'.
+    move : int
+        The move chosen, None if the game is finished.
+    value : float
+        The evaluation of the position, None if it wasn't searched.
+    depth : int
+        The depth of the search.
+    nodes : int
+        The nodes visited.
+    leaf_evaluations : int
+        The positions scored at the horizon or at the end of the game.
+    cutoffs : int
+        The alpha-beta cutoffs.
+    cutoffs_per_ply : Dict[int, int]
+        The alpha-beta cutoffs at each distance to the root.
+    max_ply : int
+        The greatest distance to the root reached.
+    table_hits : int
+        The lookups that found an entry in the transposition table.
+    table_misses : int
+        The lookups that didn't find an entry in the transposition table.
+    elapsed : float
+        The wall time of the search in seconds.
+    iterations : List[IterationStats]
+        The completed iterations of the iterative deepening.
+    playouts : int
+        The random games played by the Monte Carlo tree search.
+    """
+    source: str
+    move: Optional[int] = None
+    value: Optional[float] = None
+    depth: int = 0
+    nodes: int = 0
+    leaf_evaluations: int = 0
+    cutoffs: int = 0
+    cutoffs_per_ply: Dict[int, int] = field(default_factory=dict)
+    max_ply: int = 0
+    table_hits: int = 0
+    table_misses: int = 0
+    elapsed: float = 0.0
+    iterations: List[IterationStats] = field(default_factory=list)
+    playouts: int = 0
+
+    def to_json(self) -> str:
+        """Get the statistics as a line of JSON."""
+        return json.dumps(asdict(self))
+
+
+@dataclass
+class MoveAnalysis:
+    """Result of one legal move in the analysis of a position.
+
+    Attributes
+    ----------
+    move : int
+        The square of the move.
+    value : float
+        The minimax evaluation after the move, positive is good for the computer.
+    outcome : str
+        'win', 'draw' or 'loss' for the player that makes the move, 'unknown'
+        if the search horizon doesn't reach the end of the game.
+    plies : int
+        The plies from the position to the end of the game along the principal
+        variation, including the move, None if the outcome is unknown.
+    principal_variation : List[int]
+        The moves expected from both players after the move.
+    """
+    move: int
+    value: float
+    outcome: str
+    plies: Optional[int]
+    principal_variation: List[int]
+
+
+class JsonLinesWriter:
+    """Write the statistics of each search as a line of JSON in a file.
+
+    It can be used as the stats callback of the AI.
+
+    Attributes
+    ----------
+    path : str
+        The path of the file, the lines are appended.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Open the file to append the lines.
+
+        Args:
+            path (str): The path of the file.
+        """
+        self.path = path
+        self._file = open(path, "a")
+
+    def __call__(self, stats: SearchStats) -> None:
+        """Write the statistics of a search.
+
+        Args:
+            stats (SearchStats): The statistics.
+        """
+        self._file.write(stats.to_json() + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        """Close the file."""
+        self._file.close()
 
 
 class AI:
@@ -10,29 +260,183 @@ class AI:
     ----------
     position : Position
         The current position of the game.
+    table : TranspositionTable
+        The table of the positions already searched.
+    solved : SolvedTable
+        The table with the best move of every board, None to always search.
+    depth : int
+        The search horizon, None to search until the end of the game.
+    time_limit : float
+        The seconds available for each move, None for no limit.
+    node_limit : int
+        The nodes that can be visited for each move, None for no limit.
+    move_ordering : bool
+        True to sort the moves before searching them, False to search them in index order.
+    parallel : ParallelSearch
+        The pool of processes that search the root moves, None to search in this process.
+    nodes : int
+        The nodes visited in the last search.
+    cutoffs : int
+        The alpha-beta cutoffs in the last search.
+    iterations : List[IterationStats]
+        The completed iterations of the last iterative deepening search.
+    last_stats : SearchStats
+        The statistics of the last move chosen.
+    stats_callback : Callable[[SearchStats], None]
+        Called with the statistics of each move chosen, None to not report them.
+    profile : bool
+        True to run each search under cProfile.
+    null_window : bool
+        True to search the moves after the first one with a null window.
+    use_mtdf : bool
+        True to search the moves with MTD(f).
+    stop_event : threading.Event
+        Set from another thread to interrupt the search, it raises SearchTimeout 
+        within a few nodes and stays set until it's cleared.
+    ponderer : Ponderer
+        The search of the replies during the turn of the human player, None 
+        if the AI doesn't ponder.
+    last_profile : pstats.Stats
+        The profile of the last search if profile is True.
         
     Methods:
     -------
     make_ai_move() -> bool
         Make a move in the TicTacToe based on the minimax algorithm result.
+    choose_move(player: int) -> Optional[int]
+        Get the best move of a player without making it or printing anything.
+    ponder() -> None
+        Search the replies to the moves of the human player in the background.
+    stop_pondering() -> None
+        Cancel the search of the replies to the moves of the human player.
+    best_moves(boards: np.ndarray, player: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]
+        Get the best move, the score and the status of a batch of boards.
+    analyze(player: int) -> List[MoveAnalysis]
+        Get the value, the outcome and the plies to the end of every legal move.
     minimax(position: Position, depth: int, maximizingPlayer: bool, 
-            alpha: float, beta: float) -> Tuple[float, Position]
+            alpha: float, beta: float) -> Tuple[float, Optional[int]]
         Minimax algorithm.
+    search(board: Board, depth: int, maximizingPlayer: bool,
+           alpha: float, beta: float, ply: int) -> float
+        Evaluate a board with alpha-beta and the transposition table.
+    negamax(board: Board, depth: int, player: int, alpha: float, beta: float, 
+            ply: int) -> float
+        Evaluate a board for the player to move with alpha-beta and the transposition table.
+    mtdf(position: Position, depth: int, maximizingPlayer: bool, 
+         first_guess: float) -> Tuple[float, Optional[int]]
+        Search the best move with MTD(f).
+    order_moves(board: Board, player: int) -> List[int]
+        Get the legal moves of a board in the order the search tries them at the root.
+    iterative_deepening(position: Position, max_depth: int, 
+                        maximizingPlayer: bool) -> Tuple[float, Optional[int]]
+        Search deeper each iteration until the budget is exhausted.
     """
 
-    def __init__(self, position: Position) -> None:
+    def __init__(self, position: Position, table: Optional[TranspositionTable] = None,
+                 use_solved_table: bool = True, depth: Optional[int] = None,
+                 time_limit: Optional[float] = None, node_limit: Optional[int] = None,
+                 move_ordering: bool = True, parallel: Optional["ParallelSearch"] = None,
+                 stats_callback: Optional[Callable[[SearchStats], None]] = None,
+                 profile: bool = False, null_window: Optional[bool] = None, use_mtdf: bool = False,
+                 ponder: bool = False) -> None:
         """Initialize the AI with the current position in the game.
 
         Args:
             position (Position): The position
+            table (TranspositionTable): The table of the positions already searched,
+                                        by default the one shared in the process.
+            use_solved_table (bool): True to answer with the solved table if its file
+                                     exists, False to always search.
+            depth (int): The search horizon, by default the classic board is searched 
+                         until the end of the game and bigger boards LARGE_BOARD_DEPTH plies.
+            time_limit (float): The seconds available for each move, if it's set the 
+                                search is performed with iterative deepening. Without 
+                                a depth, a node limit, parallel search or MTD(f), bigger 
+                                boards get LARGE_BOARD_TIME_LIMIT seconds.
+            node_limit (int): The nodes that can be visited for each move, if it's set 
+                              the search is performed with iterative deepening.
+            move_ordering (bool): True to sort the moves before searching them, False 
+                                  to search them in index order.
+            parallel (ParallelSearch): The pool of processes that search the root moves 
+                                       when there is no time or node budget.
+            stats_callback (Callable[[SearchStats], None]): Called with the statistics of 
+                                                            each move chosen, for example 
+                                                            a JsonLinesWriter.
+            profile (bool): True to run each search under cProfile, the result is kept 
+                            in last_profile.
+            null_window (bool): True to search the moves after the first one with a 
+                                null window (principal variation search), False for 
+                                plain alpha-beta. By default it's only used on boards 
+                                bigger than the classic board: on all the reachable 
+                                3x3 positions it visits 101.2% of the nodes of the 
+                                plain alpha-beta, and 83-97% on the bigger boards of 
+                                validate_search.
+            use_mtdf (bool): True to search the moves with MTD(f) when there is no 
+                             time or node budget or parallel search.
+            ponder (bool): True to search the replies to the moves of the human player 
+                           while it thinks, see the method ponder.
+                         
+        Raises:
+            ValueError: if the depth is lower than 1.
         """
+        if depth is not None and depth < 1:
+            raise ValueError("The depth of the search must be at least 1")
+        geometry = position.board.geometry
         self.position = position
+        self.table = table if table is not None else get_shared_table(geometry)
+        # The solved table only has the boards of the classic board
+        self.solved: Optional[SolvedTable] = None
+        if use_solved_table and geometry is CLASSIC:
+            self.solved = default_table()
+        if depth is None and geometry is not CLASSIC:
+            depth = LARGE_BOARD_DEPTH
+            if time_limit is None and node_limit is None and parallel is None and not use_mtdf:
+                time_limit = LARGE_BOARD_TIME_LIMIT
+        self.depth = depth
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.move_ordering = move_ordering
+        self.parallel = parallel
+        self.stats_callback = stats_callback
+        self.profile = profile
+        if null_window is None:
+            null_window = geometry is not CLASSIC
+        self.null_window = null_window
+        self.use_mtdf = use_mtdf
+        self.ponderer: "Optional[Ponderer]" = None
+        if ponder:
+            # Imported here because the module imports the AI
+            from ponder import Ponderer
+            self.ponderer = Ponderer(self)
+        self.last_stats: Optional[SearchStats] = None
+        self.last_profile: "Optional[pstats.Stats]" = None
+        self.leaf_evaluations = 0
+        self.max_ply = 0
+        self.cutoffs_per_ply: Dict[int, int] = {}
+        self.nodes = 0
+        self.cutoffs = 0
+        self.iterations: List[IterationStats] = []
+        self._history = [[0] * geometry.size, [0] * geometry.size]
+        self._killers: Dict[int, List[int]] = {}
+        self.stop_event = threading.Event()
+        self._deadline = float('inf')
+        self._max_nodes = float('inf')
+        # The work of the search, a unit for each node and each move ordered,
+        # and the work at which the clock and the stop event are checked next
+        self._work = 0
+        self._next_check = 0
+        self._check_interval = 16
+        self._last_check = time.perf_counter()
+        self._principal_variation: List[int] = []
+        # True if the path from the root to the node searched next follows the
+        # principal variation of the previous iteration
+        self._on_pv = False
+        self._pv_table: Dict[int, List[int]] = {}
+        self._root_best: Optional[int] = None
 
     def make_ai_move(self) -> bool:
         """Make a move in the TicTacToe based on the minimax algorithm result."""
-        
-        # Choose the best move
-        best_move_value, best_move = self.minimax(self.position, self.position.get_empty_positions(), True)
+        best_move = self.choose_move()
         
         # If there is no valid move
         if best_move is None:
@@ -40,52 +444,707 @@ class AI:
             return False
         
         # Generate a copy of the position to avoid changing the original position 
-        # because we want to avoid that the children are generated by reference
-        self.position = best_move.copy()
+        # that can be shared with the game
+        board = self.position.board.copy()
+        board.make_move(best_move, 0)
+        self.position = Position.from_board(board)
         
         print("\nComputer move:")
         return True
     
+    def choose_move(self, player: int = 0) -> Optional[int]:
+        """Get the best move of a player without making it or printing anything.
+        
+        The move is read from the solved table when it's available, 
+        otherwise the minimax search is performed. If there is a time or node 
+        budget the search is performed with iterative deepening. If the AI 
+        pondered the move of the human player its result is used. The statistics 
+        of the search are kept in last_stats and sent to the stats callback.
+
+        Args:
+            player (int): The player to move, 0 for the computer and 1 for the human player.
+
+        Returns:
+            int: The index of the best move.
+            None: If the game is finished.
+        """
+        profiler = None
+        if self.profile:
+            # The profiler modules are only imported when they're used
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+        start = time.perf_counter()
+        pondered = None
+        if self.ponderer is not None and player == 0:
+            # The background search is finished before the table is used here
+            pondered = self.ponderer.take(self.position.board)
+            if pondered is not None:
+                # The principal variation of this AI is the one of its last search,
+                # the next pondering expects the reply of the pondered search
+                self._principal_variation = []
+                self._pv_table = {}
+                if pondered.iterations:
+                    last = pondered.iterations[-1]
+                    self._pv_table[0] = [last.move] + last.principal_variation
+        hits = self.table.hits
+        misses = self.table.misses
+        try:
+            stats = pondered if pondered is not None else self._choose_move(player)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                import pstats
+                self.last_profile = pstats.Stats(profiler)
+        stats.elapsed = time.perf_counter() - start
+        stats.table_hits = self.table.hits - hits
+        stats.table_misses = self.table.misses - misses
+        self.table.flush()
+        
+        self.last_stats = stats
+        if self.stats_callback is not None:
+            self.stats_callback(stats)
+        return stats.move
+    
+    def ponder(self) -> None:
+        """Search the replies to the moves of the human player in the background.
+
+        It's called when the human player is to move, the reply to the move 
+        expected by the last search is searched first. The next call to 
+        choose_move uses the result if the human player made a searched move 
+        and cancels the background search otherwise.
+
+        Raises:
+            ValueError: if the AI was created without pondering.
+        """
+        if self.ponderer is None:
+            raise ValueError("The AI was created without pondering")
+        principal_variation = self._pv_table.get(0, [])
+        expected = None
+        if (len(principal_variation) > 1 and self.last_stats is not None
+                and principal_variation[0] == self.last_stats.move):
+            expected = principal_variation[1]
+        self.ponderer.start(self.position.board, expected)
+    
+    def stop_pondering(self) -> None:
+        """Cancel the search of the replies to the moves of the human player."""
+        if self.ponderer is not None:
+            self.ponderer.stop()
+    
+    def _choose_move(self, player: int = 0) -> SearchStats:
+        """Choose the best move with the solved table or a search.
+
+        Args:
+            player (int): The player to move, 0 for the computer and 1 for the human player.
+
+        Returns:
+            SearchStats: The move and the counters of the search.
+        """
+        if self.position.game_over:
+            return SearchStats("none")
+        if self.solved is not None:
+            entry = self.solved.lookup(self.position.board, player)
+            return SearchStats("solved_table", entry.best_move, entry.value)
+        
+        # Choose the best move
+        depth = self.position.get_empty_positions()
+        if self.depth is not None:
+            depth = min(depth, self.depth)
+        if self.time_limit is not None or self.node_limit is not None:
+            source = "iterative_deepening"
+            best_move_value, best_move = self.iterative_deepening(self.position, depth, player == 0)
+        elif self.parallel is not None and player == 0:
+            # The workers only search the moves of the computer
+            source = "parallel"
+            self._new_search()
+            best_move_value, best_move = self.parallel.search(self.position, depth, self)
+            self.nodes = self.parallel.nodes
+        elif self.use_mtdf:
+            source = "mtdf"
+            self._new_search()
+            best_move_value, best_move = self.mtdf(self.position, depth, player == 0)
+        else:
+            source = "minimax"
+            self._new_search()
+            best_move_value, best_move = self.minimax(self.position, depth, player == 0)
+        return SearchStats(source, best_move, best_move_value, depth, self.nodes, 
+                           self.leaf_evaluations, self.cutoffs, dict(self.cutoffs_per_ply),
+                           self.max_ply, iterations=list(self.iterations))
+    
+    @staticmethod
+    def best_moves(boards, player: int = 0):
+        """Get the best move, the score and the status of a batch of boards.
+
+        It doesn't change the position of the AI or print anything, see 
+        batch.best_moves for the format of the boards and the results.
+
+        Args:
+            boards (np.ndarray): The boards, an array of shape (N, 9).
+            player (int): The player to move in all the boards.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: The best moves, the scores 
+                and the status of the boards.
+        """
+        return batch.best_moves(boards, player)
+    
+    def analyze(self, player: int = 0) -> List[MoveAnalysis]:
+        """Get the value, the outcome and the plies to the end of every legal move.
+
+        On the classic board the moves are read from the solved table. Otherwise
+        each child is searched with the full window, so every value is exact, and
+        the siblings share the transposition table and the move ordering heuristics.
+        It doesn't change the position of the AI or print anything.
+
+        Args:
+            player (int): The player to move, 0 for the computer and 1 for the human player.
+
+        Returns:
+            List[MoveAnalysis]: The analysis of each move, the best ones for the
+                                player first and in the order of the squares on ties.
+        """
+        board = self.position.board
+        if board.status() is not None:
+            return []
+        opponent = 1 - player
+        analysis = []
+        if self.solved is not None:
+            for move in board.possible_moves():
+                child = board.copy()
+                child.make_move(move, player)
+                entry = self.solved.lookup(child, opponent)
+                analysis.append(MoveAnalysis(move, entry.value, self._outcome(entry.value, player, True),
+                                             entry.distance + 1, self._solved_line(child, opponent)))
+        else:
+            depth = board.empty_count()
+            if self.depth is not None:
+                depth = min(depth, self.depth)
+            self._new_search()
+            child = board.copy()
+            for move in self._order_moves(child, child.possible_moves(), player, 0):
+                child.make_move(move, player)
+                value = self.search(child, depth - 1, player == 1, float('-inf'), float('inf'), 1)
+                # The search reaches the end of the game in every line
+                exhaustive = depth > child.empty_count()
+                outcome = self._outcome(value, player, exhaustive)
+                line = self._search_line(child, opponent, depth - 1, value)
+                plies = len(line) + 1 if outcome != "unknown" else None
+                analysis.append(MoveAnalysis(move, value, outcome, plies, line))
+                child.undo_move(move, player)
+            analysis.sort(key=lambda result: result.move)
+        sign = 1 if player == 0 else -1
+        analysis.sort(key=lambda result: -sign * result.value)
+        return analysis
+
+    def _outcome(self, value: float, player: int, exhaustive: bool) -> str:
+        """Get the result of the game for a player from a minimax value.
+
+        Args:
+            value (float): The minimax evaluation.
+            player (int): 0 for the computer, 1 for the human player.
+            exhaustive (bool): True if the value comes from the end of the game in every line.
+
+        Returns:
+            str: 'win', 'draw', 'loss' or 'unknown'.
+        """
+        win_score = self.position.board.geometry.win_score
+        if value >= win_score:
+            return "win" if player == 0 else "loss"
+        if value <= -win_score:
+            return "loss" if player == 0 else "win"
+        return "draw" if exhaustive else "unknown"
+
+    def _solved_line(self, board: Board, player: int) -> List[int]:
+        """Get the moves played with the solved table until the end of the game.
+
+        Args:
+            board (Board): The board, it's not changed.
+            player (int): The player to move.
+
+        Returns:
+            List[int]: The moves of both players.
+        """
+        board = board.copy()
+        line = []
+        move = self.solved.best_move(board, player)
+        while move is not None:
+            board.make_move(move, player)
+            line.append(move)
+            player = 1 - player
+            move = self.solved.best_move(board, player)
+        return line
+
+    def _search_line(self, board: Board, player: int, depth: int, value: float) -> List[int]:
+        """Get the moves of the best play from a board that was just searched.
+
+        The line is the principal variation of the search. It stops at the
+        positions answered by the transposition table, so it's continued with
+        the move whose entry has the same value, all the positions of the best
+        play have the value of the board. A position without such an entry,
+        because it was replaced, is searched again.
+
+        Args:
+            board (Board): The board searched at ply 1, it's not changed.
+            player (int): The player to move.
+            depth (int): The depth remaining from the board.
+            value (float): The value of the board.
+
+        Returns:
+            List[int]: The moves of both players until the end of the game or the horizon.
+        """
+        board = board.copy()
+        line = []
+        variation = self._pv_table.get(1, [])
+        while True:
+            for move in variation:
+                board.make_move(move, player)
+                line.append(move)
+                player = 1 - player
+                depth -= 1
+            if depth <= 0 or board.status() is not None:
+                return line
+            move = self._table_move(board, player, depth, value)
+            if move is not None:
+                variation = [move]
+                continue
+            self.minimax(Position.from_board(board), depth, player == 0)
+            variation = self._pv_table.get(0, [])
+            if not variation:
+                return line
+
+    def _table_move(self, board: Board, player: int, depth: int, value: float) -> Optional[int]:
+        """Find the move of a board whose child has its value in the transposition table.
+
+        A bound in the direction of the player to move is enough, the child
+        can't be better than the board.
+
+        Args:
+            board (Board): The board, the moves are made and undone in it.
+            player (int): The player to move.
+            depth (int): The depth remaining from the board.
+            value (float): The value of the board.
+
+        Returns:
+            int: The move that keeps the value.
+            None: If no child has an entry with the value.
+        """
+        bound = LOWER_BOUND if player == 0 else UPPER_BOUND
+        for move in board.possible_moves():
+            board.make_move(move, player)
+            status, child_value = board.outcome()
+            if status is not None or depth == 1:
+                found = child_value == value
+            else:
+                entry = self.table.lookup(canonical_key(board, player == 1))
+                found = (entry is not None and entry.depth >= depth - 1 and entry.value == value
+                         and entry.flag in (EXACT, bound))
+            board.undo_move(move, player)
+            if found:
+                return move
+        return None
+
     def minimax(self, position: Position, depth: int, maximizingPlayer: bool,
-                alpha: float = float('-inf'), beta: float = float('inf')) -> Tuple[float, Position]:
+                alpha: float = float('-inf'), beta: float = float('inf')) -> Tuple[float, Optional[int]]:
         """Minimax algorithm.
 
+        The search is a negamax with principal variation search: the first move 
+        gets the full window and the rest a null window that only proves they 
+        aren't better, they are searched again if they are. With null_window 
+        False every move gets the full window (plain alpha-beta). The moves are made 
+        and undone on a single copy of the board and the root position is always 
+        expanded to know which move is the best.
+
         Args:
             position (Position): The current position.
-            depth (int): The depth of the tree.
+            depth (int): The depth of the tree, the positions at depth 0 are 
+                         scored with the heuristic evaluation.
             maximizingPlayer (bool): True if the Player is maximizing, False otherwise.
             alpha (float): The best value that the maximizing player is assured of.
             beta (float): The best value that the minimizing player is assured of.
         Returns:
-            Tuple[float, Position]: The evaluation of the position and the position itself.
+            Tuple[float, Optional[int]]: The evaluation of the position and the index
+                                         of the best move, None if there is no move.
         """
         if depth == 0 or position.game_over:
-            return position.evaluation, position
+            return position.evaluation, None
         
+        self._pv_table = {}
+        self._root_best = None
+        board = position.board.copy()
+        player = 0 if maximizingPlayer else 1
+        # The window of the negamax is seen by the player to move
+        if not maximizingPlayer:
+            alpha, beta = -beta, -alpha
+        bestEvaluation = float('-inf')
+        bestMove = None
+        pv_move = self._pv_move(0, True)
+        for move in self._order_moves(board, board.possible_moves(), player, 0):
+            self._on_pv = move == pv_move
+            board.make_move(move, player)
+            eval = self._search_child(board, depth - 1, 1 - player, alpha, beta, 1, bestMove is None)
+            board.undo_move(move, player)
+            if eval > bestEvaluation:
+                bestEvaluation = eval
+                bestMove = move
+                self._root_best = move
+                self._pv_table[0] = [move] + self._pv_table.get(1, [])
+            alpha = max(alpha, eval)
+            if beta <= alpha:
+                self._record_cutoff(move, player, 0, depth)
+                break
+        return bestEvaluation if maximizingPlayer else -bestEvaluation, bestMove
+    
+    def search(self, board: Board, depth: int, maximizingPlayer: bool,
+               alpha: float = float('-inf'), beta: float = float('inf'), ply: int = 1) -> float:
+        """Evaluate a board with alpha-beta and the transposition table.
+
+        The moves are made and undone in the board, so it's left as it was 
+        unless the search is interrupted by the budget. The value is stored as 
+        exact if it's inside the window, as a lower bound if it caused a cutoff 
+        (beta) and as an upper bound if no move improved alpha.
+        
+        Args:
+            board (Board): The board to evaluate.
+            depth (int): The depth of the tree.
+            maximizingPlayer (bool): True if the Player is maximizing, False otherwise.
+            alpha (float): The best value that the maximizing player is assured of.
+            beta (float): The best value that the minimizing player is assured of.
+            ply (int): The distance to the root of the search.
+
+        Returns:
+            float: The evaluation of the board.
+            
+        Raises:
+            SearchTimeout: if the time or node budget is exhausted.
+        """
         if maximizingPlayer:
-            maxEvaluation = float('-inf') 
-            maxChild = None
-            for move in position.get_possible_moves():
-                child = position.copy()
-                child.pos_list[move] = 0
-                eval, _ = self.minimax(child, depth - 1, False, alpha, beta)
-                if eval > maxEvaluation:
-                    maxEvaluation = eval
-                    maxChild = child
-                alpha = max(alpha, eval)
-                if beta <= alpha:
-                    break
-            return maxEvaluation, maxChild
+            return self.negamax(board, depth, 0, alpha, beta, ply)
+        return -self.negamax(board, depth, 1, -beta, -alpha, ply)
+    
+    def _search_child(self, board: Board, depth: int, player: int, alpha: float, beta: float,
+                      ply: int, first: bool) -> float:
+        """Get the value of a move for the player that made it with principal variation search.
+
+        Args:
+            board (Board): The board after the move.
+            depth (int): The depth of the tree from the board.
+            player (int): The player to move in the board, the opponent of the one that moved.
+            alpha (float): The best value that the player that moved is assured of.
+            beta (float): The best value that the opponent is assured of, both seen 
+                          by the player that moved.
+            ply (int): The distance from the root to the board.
+            first (bool): True if it's the first move searched, it gets the full window.
+
+        Returns:
+            float: The value for the player that made the move.
+        """
+        if first or not self.null_window:
+            return -self.negamax(board, depth, player, -beta, -alpha, ply)
+        # The values are integers, so a window of width 1 only tells if the move 
+        # is better than alpha
+        value = -self.negamax(board, depth, player, -alpha - 1, -alpha, ply)
+        if alpha < value < beta:
+            value = -self.negamax(board, depth, player, -beta, -alpha, ply)
+        return value
+    
+    def negamax(self, board: Board, depth: int, player: int, alpha: float = float('-inf'),
+                beta: float = float('inf'), ply: int = 1) -> float:
+        """Evaluate a board for the player to move with alpha-beta and the transposition table.
+
+        The value and the window are seen by the player to move, the value of a 
+        child is the negative of its value for the opponent. The entries of the 
+        transposition table are kept from the point of view of the computer.
+
+        Args:
+            board (Board): The board to evaluate.
+            depth (int): The depth of the tree.
+            player (int): The player to move, 0 for the computer and 1 for the human player.
+            alpha (float): The best value that the player to move is assured of.
+            beta (float): The best value that the opponent is assured of.
+            ply (int): The distance to the root of the search.
+
+        Returns:
+            float: The evaluation of the board for the player to move.
+            
+        Raises:
+            SearchTimeout: if the time or node budget is exhausted.
+        """
+        self.nodes += 1
+        if self.nodes >= self._max_nodes:
+            raise SearchTimeout()
+        self._work += 1
+        if self._work >= self._next_check:
+            self._check_clock()
+        
+        self._pv_table[ply] = []
+        if ply > self.max_ply:
+            self.max_ply = ply
+        status, value = board.outcome()
+        if depth == 0 or status is not None:
+            self.leaf_evaluations += 1
+            return value if player == 0 else -value
+        
+        key = canonical_key(board, player == 0)
+        entry = self.table.lookup(key)
+        if entry is not None and entry.depth >= depth:
+            value = entry.value if player == 0 else -entry.value
+            flag = entry.flag
+            # A bound of the computer is the opposite bound for the human player
+            if player == 1 and flag != EXACT:
+                flag = UPPER_BOUND if flag == LOWER_BOUND else LOWER_BOUND
+            if flag == EXACT:
+                return value
+            if flag == LOWER_BOUND:
+                alpha = max(alpha, value)
+            else:
+                beta = min(beta, value)
+            if beta <= alpha:
+                return value
+        
+        alpha_start = alpha
+        best = float('-inf')
+        first = True
+        on_pv = self._on_pv
+        pv_move = self._pv_move(ply, on_pv)
+        moves = board.possible_moves()
+        # Sorting the moves of a big board costs much more than a leaf
+        self._work += len(moves)
+        for move in self._order_moves(board, moves, player, ply, on_pv):
+            self._on_pv = move == pv_move
+            board.make_move(move, player)
+            eval = self._search_child(board, depth - 1, 1 - player, alpha, beta, ply + 1, first)
+            board.undo_move(move, player)
+            first = False
+            if eval > best:
+                best = eval
+                self._pv_table[ply] = [move] + self._pv_table.get(ply + 1, [])
+            alpha = max(alpha, eval)
+            if beta <= alpha:
+                self._record_cutoff(move, player, ply, depth)
+                break
+        
+        if best <= alpha_start:
+            flag = UPPER_BOUND
+        elif best >= beta:
+            flag = LOWER_BOUND
         else:
-            minEvaluation = float('inf')
-            minChild = None
-            for move in position.get_possible_moves():          
-                child = position.copy()
-                eval, _ = self.minimax(child, depth - 1, True, alpha, beta)
-                if eval < minEvaluation:
-                    minEvaluation = eval
-                    minChild = child
-                beta = min(beta, eval)
-                if beta <= alpha:
+            flag = EXACT
+        if player == 1:
+            best_value = -best
+            if flag != EXACT:
+                flag = UPPER_BOUND if flag == LOWER_BOUND else LOWER_BOUND
+        else:
+            best_value = best
+        self.table.store(key, depth, best_value, flag)
+        return best
+    
+    def mtdf(self, position: Position, depth: int, maximizingPlayer: bool = True,
+             first_guess: float = 0) -> Tuple[float, Optional[int]]:
+        """Search the best move with MTD(f).
+
+        Each pass is a null window search of the root that tells if the value 
+        is above or below a guess, the bounds converge to the value in a few 
+        passes and the transposition table keeps the work of the previous ones.
+
+        Args:
+            position (Position): The current position.
+            depth (int): The depth of the tree.
+            maximizingPlayer (bool): True if the Player is maximizing, False otherwise.
+            first_guess (float): The expected value, the closer the fewer passes.
+
+        Returns:
+            Tuple[float, Optional[int]]: The evaluation of the position and the index
+                                         of the best move, None if there is no move.
+        """
+        if depth == 0 or position.game_over:
+            return position.evaluation, None
+        
+        value = first_guess
+        bestMove = None
+        lower = float('-inf')
+        upper = float('inf')
+        while lower < upper:
+            beta = value + 1 if value == lower else value
+            value, move = self.minimax(position, depth, maximizingPlayer, beta - 1, beta)
+            if value < beta:
+                upper = value
+            else:
+                lower = value
+            # Only a pass that the player to move wins proves that its move 
+            # reaches the value, the move of the other passes can be any move
+            if maximizingPlayer == (value >= beta):
+                bestMove = move
+        return value, bestMove
+    
+    def order_moves(self, board: Board, player: int) -> List[int]:
+        """Get the legal moves of a board in the order the search tries them at the root.
+
+        Args:
+            board (Board): The board, it's not changed.
+            player (int): The player to move.
+
+        Returns:
+            List[int]: The moves, the most promising first.
+        """
+        return self._order_moves(board, board.possible_moves(), player, 0)
+
+    def _pv_move(self, ply: int, on_pv: bool) -> Optional[int]:
+        """Get the move of the previous principal variation at a ply.
+
+        Args:
+            ply (int): The distance to the root of the search.
+            on_pv (bool): True if the path to the node follows the principal variation.
+
+        Returns:
+            int: The move of the principal variation.
+            None: If the path left it or it's shorter than the ply.
+        """
+        if on_pv and ply < len(self._principal_variation):
+            return self._principal_variation[ply]
+        return None
+
+    def _order_moves(self, board: Board, moves: List[int], player: int, ply: int,
+                     on_pv: bool = True) -> List[int]:
+        """Sort the moves to search first the ones most likely to cause a cutoff.
+
+        The move of the principal variation of the previous iteration goes first 
+        if the path to the node follows that variation, then the winning moves, the moves that block a win of the opponent, the 
+        squares with more lines (center, then corners), and finally the killer moves
+        of the same ply and the history of the moves that caused cutoffs.
+
+        Args:
+            board (Board): The board where the moves are made.
+            moves (List[int]): The possible moves.
+            player (int): The player to move.
+            ply (int): The distance to the root of the search.
+            on_pv (bool): True if the path to the node follows the principal variation.
+
+        Returns:
+            List[int]: The moves in the order to search them.
+        """
+        if not self.move_ordering:
+            return moves
+        
+        pv_move = self._pv_move(ply, on_pv)
+        killers = self._killers.get(ply, ())
+        history = self._history[player]
+        static_priority = board.move_priority(player)
+        
+        def priority(move: int) -> Tuple[object, ...]:
+            return (move == pv_move, static_priority(move), move in killers, history[move])
+        
+        moves.sort(key=priority, reverse=True)
+        return moves
+    
+    def _record_cutoff(self, move: int, player: int, ply: int, depth: int) -> None:
+        """Remember a move that caused a cutoff for the killer and history heuristics.
+
+        Args:
+            move (int): The move that caused the cutoff.
+            player (int): The player that made the move.
+            ply (int): The distance to the root of the search.
+            depth (int): The depth remaining when the move was searched.
+        """
+        self.cutoffs += 1
+        self.cutoffs_per_ply[ply] = self.cutoffs_per_ply.get(ply, 0) + 1
+        killers = self._killers.setdefault(ply, [])
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[2:]
+        self._history[player][move] += depth * depth
+        
+    def _check_clock(self) -> None:
+        """Check the deadline and the stop event and plan the next check.
+
+        The work until the next check is scaled so the checks are about
+        CLOCK_CHECK_PERIOD seconds apart, a node of a big board orders many
+        more moves than one of the classic board.
+
+        Raises:
+            SearchTimeout: if the deadline has passed or the search was stopped.
+        """
+        now = time.perf_counter()
+        if now > self._deadline or self.stop_event.is_set():
+            raise SearchTimeout()
+        elapsed = now - self._last_check
+        interval = self._check_interval
+        if elapsed > 0:
+            interval = int(interval * CLOCK_CHECK_PERIOD / elapsed)
+        # Grow slowly, a few fast nodes don't mean the next ones are fast
+        self._check_interval = max(1, min(interval, 2 * self._check_interval, 4096))
+        self._last_check = now
+        self._next_check = self._work + self._check_interval
+
+    def _new_search(self) -> None:
+        """Reset the counters and heuristics before searching a new move."""
+        self.nodes = 0
+        self.cutoffs = 0
+        self.leaf_evaluations = 0
+        self.max_ply = 0
+        self._work = 0
+        self._next_check = 0
+        self._last_check = time.perf_counter()
+        self.cutoffs_per_ply = {}
+        self.iterations = []
+        self._principal_variation = []
+        self._killers = {}
+        size = self.position.board.geometry.size
+        self._history = [[0] * size, [0] * size]
+    
+    def iterative_deepening(self, position: Position, max_depth: int,
+                            maximizingPlayer: bool = True) -> Tuple[float, Optional[int]]:
+        """Search deeper each iteration until the budget is exhausted.
+
+        Each iteration searches first the principal variation of the previous one.
+        If the budget runs out in the middle of an iteration its result is discarded
+        and the best move of the last completed iteration is returned. An iteration
+        that can't finish before the time limit is not started.
+
+        Args:
+            position (Position): The current position.
+            max_depth (int): The depth of the last iteration.
+            maximizingPlayer (bool): True if the Player is maximizing, False otherwise.
+
+        Returns:
+            Tuple[float, Optional[int]]: The evaluation of the position and the index
+                                         of the best move.
+        """
+        start = time.perf_counter()
+        self._deadline = start + self.time_limit if self.time_limit is not None else float('inf')
+        self._max_nodes = self.node_limit if self.node_limit is not None else float('inf')
+        self._new_search()
+        
+        best: Tuple[float, Optional[int]] = (float('-inf'), None)
+        win_score = position.board.geometry.win_score
+        try:
+            for depth in range(1, max_depth + 1):
+                iteration_start = time.perf_counter()
+                nodes_start = self.nodes
+                value, move = self.minimax(position, depth, maximizingPlayer)
+                best = (value, move)
+                self._principal_variation = self._pv_table.get(0, [])
+                self.iterations.append(IterationStats(
+                    depth, value, self._principal_variation[0], self._principal_variation[1:],
+                    self.nodes - nodes_start, time.perf_counter() - iteration_start))
+                # A forced win or loss doesn't change with a deeper search
+                if abs(value) >= win_score:
+                    break
+                # A deeper iteration takes at least as long as the last one, if that
+                # doesn't fit before the deadline the iteration can't finish
+                if time.perf_counter() + self.iterations[-1].elapsed > self._deadline:
                     break
-            return minEvaluation, minChild
\ No newline at end of file
+        except SearchTimeout:
+            # Without a completed iteration use the best move found so far
+            if best[1] is None:
+                # The worst value for the player, the move isn't evaluated
+                worst = float('-inf') if maximizingPlayer else float('inf')
+                if self._root_best is not None:
+                    best = (worst, self._root_best)
+                else:
+                    moves = self._order_moves(position.board, position.get_possible_moves(),
+                                              0 if maximizingPlayer else 1, 0)
+                    best = (worst, moves[0])
+        finally:
+            self._deadline = float('inf')
+            self._max_nodes = float('inf')
+        return best
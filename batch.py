@@ -0,0 +1,141 @@
+"""
+Evaluate many TicTacToe boards in one call.
+
+The boards are a NumPy array of shape (N, 9) where each square is -1 if it's
+empty, 0 for the computer (O) and 1 for the human player (X). The win detection
+is vectorized across the batch and the best moves are read from the solved table
+indexed by the base 3 code of each board.
+"""
+from typing import Tuple
+
+import solved_table
+
+
+# NumPy is only needed by the batch API, it's imported on the first call
+# so importing the AI doesn't pay for it
+np = None
+
+
+EMPTY = -1
+
+# Status of each board in the batch
+UNFINISHED = -1
+COMPUTER_WINS = 0
+PLAYER_WINS = 1
+TIE = 2
+
+LINES = (
+    (0, 1, 2), (3, 4, 5), (6, 7, 8),
+    (0, 3, 6), (1, 4, 7), (2, 5, 8),
+    (0, 4, 8), (2, 4, 6),
+)
+
+_records = None
+# The lowest square of each mask of best moves, the move played by the AI
+_lowest_squares = None
+
+
+def _require_numpy() -> None:
+    """Import NumPy the first time it's needed.
+
+    Raises:
+        ImportError: if NumPy is not installed.
+    """
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("The batch API requires NumPy, install it with 'pip install numpy'") from None
+        np = numpy
+
+
+def _solved_records():
+    """Get the records of the solved table as a NumPy structured array.
+
+    The shipped file is used without copying it, if it's missing the
+    boards are solved in memory once.
+    """
+    global _records
+    if _records is None:
+        dtype = np.dtype([("value", "<i2"), ("moves", "<u2"), ("distance", "u1"), ("flags", "u1")])
+        table = solved_table.default_table()
+        if table is not None:
+            _records = np.frombuffer(table._map, dtype=dtype, count=solved_table.RECORD_COUNT,
+                                     offset=solved_table.HEADER.size)
+        else:
+            _records = np.frombuffer(bytes(solved_table.solve()), dtype=dtype)
+    return _records
+
+
+def _lowest_square():
+    """Get the lowest square of each of the 512 masks of moves, built once."""
+    global _lowest_squares
+    if _lowest_squares is None:
+        _lowest_squares = np.array([(mask & -mask).bit_length() - 1 for mask in range(512)], dtype=np.int8)
+    return _lowest_squares
+
+
+def game_status(boards) -> "np.ndarray":
+    """Get the status of each board.
+
+    Args:
+        boards (np.ndarray): The boards, an array of shape (N, 9).
+
+    Returns:
+        np.ndarray: COMPUTER_WINS, PLAYER_WINS, TIE or UNFINISHED for each board.
+    """
+    _require_numpy()
+    boards = np.asarray(boards)
+    lines = np.array(LINES)
+    computer_wins = (boards[:, lines] == 0).all(axis=2).any(axis=1)
+    player_wins = (boards[:, lines] == 1).all(axis=2).any(axis=1)
+    full = (boards != EMPTY).all(axis=1)
+
+    status = np.full(len(boards), UNFINISHED, dtype=np.int8)
+    status[full] = TIE
+    status[player_wins] = PLAYER_WINS
+    status[computer_wins] = COMPUTER_WINS
+    return status
+
+
+def best_moves(boards, player: int = 0) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+    """Get the best move, the score and the status of each board.
+
+    Args:
+        boards (np.ndarray): The boards, an array of shape (N, 9).
+        player (int): The player to move in all the boards, 0 for the computer
+                      and 1 for the human player.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: The index of the best move
+            (-1 if the game is finished), the minimax score and the status of
+            each board.
+
+    Raises:
+        ImportError: if NumPy is not installed.
+        ValueError: if the boards don't have shape (N, 9), aren't integers, have
+                    values other than -1, 0 and 1 or the player is not 0 or 1.
+    """
+    _require_numpy()
+    boards = np.asarray(boards)
+    if boards.ndim != 2 or boards.shape[1] != 9:
+        raise ValueError(f"The boards must have shape (N, 9), not {boards.shape}")
+    if not np.issubdtype(boards.dtype, np.integer):
+        raise ValueError(f"The boards must be integers, not {boards.dtype}")
+    if not np.isin(boards, (EMPTY, 0, 1)).all():
+        raise ValueError("The squares of the boards must be -1, 0 or 1")
+    if player not in (0, 1):
+        raise ValueError("The player must be 0 or 1")
+
+    # Base 3 code of each board, 1 for the computer and 2 for the human player
+    digits = np.where(boards == EMPTY, 0, boards + 1)
+    codes = digits @ (3 ** np.arange(9))
+    records = _solved_records()[codes * 2 + player]
+
+    # The AI plays the lowest of the best moves
+    moves = _lowest_square()[records["moves"]]
+
+    status = game_status(boards)
+    moves[status != UNFINISHED] = -1
+    return moves, records["value"].astype(np.int16), status
@@ -0,0 +1,346 @@
+"""
+Benchmarks of the TicTacToe engine.
+
+- Micro-benchmarks of the hot methods of Position.
+- Nodes per second of the minimax search on a fixed corpus of positions.
+- Nodes per second of the move generation, enumerating the full game tree.
+- Games per second of the AI playing against itself.
+- Cold starts per second of the game, from launching main.py to the first AI move.
+
+The results are written as JSON and can be compared with a saved baseline,
+the command fails if a benchmark is slower than the baseline by more than
+the tolerance:
+
+    python bench.py --output baseline.json
+    python bench.py --baseline baseline.json --tolerance 0.1
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import timeit
+from typing import Callable, Dict, List, Optional, Tuple
+
+from ai import AI
+from perft import perft
+from position import Position, get_geometry
+from transposition import TranspositionTable
+
+
+# Boards and depths of the search corpus
+SEARCH_CASES = (((3, 3, 3), None), ((4, 4, 3), 5), ((5, 5, 4), 4))
+POSITIONS_PER_CASE = 20
+# Nodes of the game tree of the empty classic board
+PERFT_NODES = 549946
+SEED = 2024
+
+
+def random_positions(rows: int, columns: int, k: int, count: int,
+                     rng: random.Random) -> List[Position]:
+    """Get unfinished positions with the computer to move.
+
+    Args:
+        rows (int): The number of rows of the board.
+        columns (int): The number of columns of the board.
+        k (int): The number of marks in a row needed to win.
+        count (int): The number of positions.
+        rng (random.Random): The random generator.
+
+    Returns:
+        List[Position]: The positions.
+    """
+    geometry = get_geometry(rows, columns, k)
+    positions = []
+    while len(positions) < count:
+        position = Position([None] * geometry.size, geometry)
+        # The same number of marks for both players, so the computer moves next
+        for _ in range(rng.randrange(0, min(geometry.size - 1, 6) // 2 + 1)):
+            for player in (1, 0):
+                moves = position.get_possible_moves()
+                position.make_move(rng.choice(moves), player)
+        if not position.game_over:
+            positions.append(position)
+    return positions
+
+
+def measure(function: Callable[[], object], repeat: int) -> float:
+    """Get the calls per second of a function, the best of several repetitions.
+
+    Args:
+        function (Callable[[], object]): The function to measure.
+        repeat (int): The number of repetitions.
+
+    Returns:
+        float: The calls per second.
+    """
+    timer = timeit.Timer(function)
+    # Enough calls for each repetition to take at least 0.2 seconds
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number))
+    return number / best
+
+
+def position_benchmarks(repeat: int) -> Dict[str, float]:
+    """Measure the hot methods of Position.
+
+    Args:
+        repeat (int): The number of repetitions of each benchmark.
+
+    Returns:
+        Dict[str, float]: The calls per second of each method.
+    """
+    position = Position([0, 1, None, None, 1, None, 0, None, None])
+    results = {
+        "position.evaluation": lambda: position.evaluation,
+        "position.game_over": lambda: position.game_over,
+        "position.check_game_status": position.check_game_status,
+        "position.get_possible_moves": position.get_possible_moves,
+        "position.get_empty_positions": position.get_empty_positions,
+        "position.copy": position.copy,
+        "position.make_undo_move": lambda: (position.make_move(2, 0), position.undo_move(2, 0)),
+    }
+    return {name: measure(function, repeat) for name, function in results.items()}
+
+
+def search_benchmarks(repeat: int) -> Dict[str, float]:
+    """Measure the nodes per second of the minimax search on the corpus.
+
+    Each repetition uses a new transposition table, so all of them search
+    the same nodes.
+
+    Args:
+        repeat (int): The number of repetitions.
+
+    Returns:
+        Dict[str, float]: The nodes per second of each board size.
+    """
+    results = {}
+    rng = random.Random(SEED)
+    for (rows, columns, k), depth in SEARCH_CASES:
+        positions = random_positions(rows, columns, k, POSITIONS_PER_CASE, rng)
+        best = 0.0
+        for _ in range(repeat):
+            table = TranspositionTable()
+            nodes = 0
+            start = time.perf_counter()
+            for position in positions:
+                ai = AI(position, table=table, use_solved_table=False, depth=depth)
+                ai.choose_move()
+                nodes += ai.nodes
+            best = max(best, nodes / (time.perf_counter() - start))
+        results[f"minimax.nodes_per_second.{rows}x{columns}k{k}"] = best
+    return results
+
+
+def perft_benchmarks(repeat: int) -> Dict[str, float]:
+    """Measure the nodes per second of the enumeration of the full game tree.
+
+    Args:
+        repeat (int): The number of repetitions.
+
+    Returns:
+        Dict[str, float]: The nodes per second of the classic board.
+
+    Raises:
+        RuntimeError: if the number of nodes is wrong.
+    """
+    best = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        nodes = sum(counts.nodes for counts in perft(Position([None] * 9)))
+        best = max(best, nodes / (time.perf_counter() - start))
+        if nodes != PERFT_NODES:
+            raise RuntimeError(f"The game tree has {nodes} nodes instead of {PERFT_NODES}")
+    return {"perft.nodes_per_second.3x3k3": best}
+
+
+def play_game(rows: int, columns: int, k: int, table: TranspositionTable,
+              rng: random.Random) -> Tuple[int, object]:
+    """Play a game of the AI against itself from a random first move.
+
+    Args:
+        rows (int): The number of rows of the board.
+        columns (int): The number of columns of the board.
+        k (int): The number of marks in a row needed to win.
+        table (TranspositionTable): The table shared by both players.
+        rng (random.Random): The random generator of the first move.
+
+    Returns:
+        Tuple[int, object]: The number of moves and the status of the game.
+    """
+    geometry = get_geometry(rows, columns, k)
+    position = Position([None] * geometry.size, geometry)
+    position.make_move(rng.randrange(geometry.size), 1)
+    moves = 1
+    while not position.game_over:
+        ai = AI(position, table=table, use_solved_table=False)
+        player = moves % 2
+        move = ai.choose_move(player)
+        position.make_move(move, player)
+        moves += 1
+    return moves, position.check_game_status()
+
+
+def self_play_benchmarks(repeat: int, games: int = 50) -> Dict[str, float]:
+    """Measure the games per second of the AI playing against itself.
+
+    Args:
+        repeat (int): The number of repetitions.
+        games (int): The number of games of each repetition.
+
+    Returns:
+        Dict[str, float]: The games per second.
+    """
+    best = 0.0
+    for _ in range(repeat):
+        rng = random.Random(SEED)
+        table = TranspositionTable()
+        start = time.perf_counter()
+        for _ in range(games):
+            play_game(3, 3, 3, table, rng)
+        best = max(best, games / (time.perf_counter() - start))
+    return {"self_play.games_per_second.3x3k3": best}
+
+
+def cold_start(command: List[str], stdin: str = "", marker: Optional[str] = None) -> float:
+    """Measure the seconds from launching a command to a line of its output.
+
+    Args:
+        command (List[str]): The command and its arguments.
+        stdin (str): The input sent to the command.
+        marker (str): The text of the line to wait for, None to wait for the end of the command.
+
+    Returns:
+        float: The seconds elapsed.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    environment = dict(os.environ, PYTHONUNBUFFERED="1")
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=directory, env=environment, stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    try:
+        process.stdin.write(stdin)
+        process.stdin.flush()
+        if marker is not None:
+            for line in process.stdout:
+                if marker in line:
+                    break
+            else:
+                raise RuntimeError(f"The command finished without printing {marker!r}")
+        else:
+            process.communicate()
+        return time.perf_counter() - start
+    finally:
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+
+
+def cold_start_benchmarks(repeat: int) -> Dict[str, float]:
+    """Measure the cold start of a new process of the game.
+
+    Args:
+        repeat (int): The number of repetitions.
+
+    Returns:
+        Dict[str, float]: The starts per second of the imports and of the game
+                          up to the first move of the AI.
+    """
+    import_time = min(cold_start([sys.executable, "-c", "import game"]) for _ in range(repeat))
+    # The human player moves first in the center, then the computer answers
+    first_move_time = min(cold_start([sys.executable, "main.py"], "2 2\nexit\n", "Computer move:")
+                          for _ in range(repeat))
+    return {
+        "cold_start.import_per_second": 1 / import_time,
+        "cold_start.first_ai_move_per_second": 1 / first_move_time,
+    }
+
+
+def run(repeat: int) -> Dict[str, object]:
+    """Run all the benchmarks.
+
+    Args:
+        repeat (int): The number of repetitions of each benchmark.
+
+    Returns:
+        Dict[str, object]: The environment and the results, higher is better in all of them.
+    """
+    results: Dict[str, float] = {}
+    results.update(position_benchmarks(repeat))
+    results.update(search_benchmarks(repeat))
+    results.update(perft_benchmarks(repeat))
+    results.update(self_play_benchmarks(repeat))
+    results.update(cold_start_benchmarks(repeat))
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(current: Dict[str, float], baseline: Dict[str, float],
+            tolerance: float) -> List[str]:
+    """Compare the results with a baseline.
+
+    Args:
+        current (Dict[str, float]): The current results.
+        baseline (Dict[str, float]): The results of the baseline.
+        tolerance (float): The fraction of the baseline that a result can lose.
+
+    Returns:
+        List[str]: The names of the benchmarks slower than the tolerance.
+    """
+    regressions = []
+    for name in sorted(current):
+        if name not in baseline:
+            print(f"{name:45} {current[name]:>14,.0f}  (not in baseline)")
+            continue
+        ratio = current[name] / baseline[name]
+        regressed = ratio < 1 - tolerance
+        if regressed:
+            regressions.append(name)
+        print(f"{name:45} {current[name]:>14,.0f}  {ratio:6.2f}x{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main() -> int:
+    """Run the benchmarks from the command line.
+
+    Returns:
+        int: 1 if there is a regression against the baseline, 0 otherwise.
+    """
+    parser = argparse.ArgumentParser(description="Benchmarks of the TicTacToe engine")
+    parser.add_argument("--repeat", type=int, default=3, help="repetitions of each benchmark")
+    parser.add_argument("--output", help="file to write the results as JSON, by default stdout")
+    parser.add_argument("--baseline", help="JSON file of a previous run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="fraction of the baseline that a benchmark can lose")
+    arguments = parser.parse_args()
+
+    report = run(arguments.repeat)
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            json.dump(report, file, indent=2)
+    elif not arguments.baseline:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if arguments.baseline:
+        with open(arguments.baseline) as file:
+            baseline = json.load(file)
+        if compare(report["results"], baseline["results"], arguments.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
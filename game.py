@@ -3,7 +3,7 @@ Control the TicTacToe game.
 It manages the game state, the game board is represented as a list of bits 
 where 1 represents an X (player), 0 represents an O (computer).
 """
-from position import Position
+from position import Position, get_geometry
 from ai import AI
 
 class Game:
@@ -16,6 +16,14 @@ class Game:
     ----------
     position : Position
         The current position of the game.
+    rows : int
+        The number of rows of the board.
+    columns : int
+        The number of columns of the board.
+    engine : str
+        The engine of the computer, 'minimax' or 'mcts'.
+    ponder : bool
+        True if the computer searches while the player thinks.
     
     Methods
     -------
@@ -23,20 +31,50 @@ class Game:
         Control the order of who plays first and displays the TicTacToe board.
     make_move_player(column: int, row: int) -> bool
         Make a move in the TicTacToe based on the row and the column in the list.
+    get_input_pondering(ai) -> bool
+        Get the move of the player while the computer searches its replies.
     get_input() -> bool
         Get the move of the player and call the AI next to make another move.
     __str__() -> str
         Print the current state of the bit list.    
     """
     
-    def __init__(self) -> None:
-        """Initialize a new TicTacToe game."""
-        self.position = Position([None for _ in range(9)])
+    def __init__(self, rows: int = 3, columns: int = 3, k: int = 3, engine: str = "minimax",
+                 ponder: bool = False) -> None:
+        """Initialize a new TicTacToe game.
+
+        Args:
+            rows (int): The number of rows of the board.
+            columns (int): The number of columns of the board.
+            k (int): The number of marks in a row needed to win.
+            engine (str): The engine of the computer, 'minimax' for the AI or 'mcts' 
+                          for the Monte Carlo tree search.
+            ponder (bool): True to search the replies of the computer while the player 
+                           thinks, only with the minimax engine.
+                          
+        Raises:
+            ValueError: if the engine is unknown or it can't ponder.
+        """
+        if engine not in ("minimax", "mcts"):
+            raise ValueError(f"Unknown engine: {engine}")
+        if ponder and engine != "minimax":
+            raise ValueError("Only the minimax engine can ponder")
+        geometry = get_geometry(rows, columns, k)
+        self.rows = rows
+        self.columns = columns
+        self.engine = engine
+        self.ponder = ponder
+        self.position = Position([None for _ in range(geometry.size)], geometry)
 
     def game_control(self) -> None:
         """Control the order of who plays first and displays the TicTacToe board."""
         counter = 1
-        ai = AI(self.position)
+        if self.engine == "mcts":
+            # Imported only when it's used, so the game starts faster
+            from mcts import MCTS
+            ai = MCTS(self.position)
+        else:
+            ai = AI(self.position, ponder=self.ponder)
         while True:
             if self.position.game_over:
                 self.position.print_game_over()
@@ -47,7 +85,7 @@ class Game:
 
             # If the user moves
             if counter % 2 == 1:
-                if not self.get_input():
+                if not self.get_input_pondering(ai):
                     break
                 self.position.print_tic_tac_toe()
 
@@ -61,7 +99,7 @@ class Game:
                 self.position.print_tic_tac_toe()
 
                 if not self.position.game_over:
-                    if not self.get_input():
+                    if not self.get_input_pondering(ai):
                         break
                     self.position.print_tic_tac_toe()
 
@@ -79,21 +117,32 @@ class Game:
         row -= 1
         column -= 1
 
-        # Make a move in the index of the list
-        if row == 0:
-            if self.position.pos_list[column] == None:
-                self.position.pos_list[column] = 1
-                return True
-        elif row == 1:
-            if self.position.pos_list[column + row + 2] == None:
-                self.position.pos_list[column + row + 2] = 1
-                return True
-        elif row == 2:
-            if self.position.pos_list[column + row + 4] == None:
-                self.position.pos_list[column + row + 4] = 1
+        # Make a move in the index of the list, the win is updated with 
+        # the counters of the lines through the square
+        if 0 <= row < self.rows and 0 <= column < self.columns:
+            index = row * self.columns + column
+            if self.position.board.get(index) is None:
+                self.position.make_move(index, 1)
                 return True
         return False
 
+    def get_input_pondering(self, ai) -> bool:
+        """Get the move of the player while the computer searches its replies.
+
+        Args:
+            ai (AI | MCTS): The engine of the computer.
+
+        Returns:
+            bool: True if the player make a move. False if the player quits.
+        """
+        if not self.ponder:
+            return self.get_input()
+        ai.ponder()
+        if not self.get_input():
+            ai.stop_pondering()
+            return False
+        return True
+
     def get_input(self) -> bool:
         """Get the move of the player and call the AI next to make another move.
 
@@ -108,17 +157,21 @@ class Game:
                 correct_col = False
                 correct_row = False
 
+                if self.rows == self.columns:
+                    limits = f"(1 to {self.rows})"
+                else:
+                    limits = f"(1 to {self.columns} and 1 to {self.rows})"
                 player_input = input(
-                    "\nType the number of the column and row (1 to 3) separated by a space\nor 'exit' to quit: ")
+                    f"\nType the number of the column and row {limits} separated by a space\nor 'exit' to quit: ")
 
                 if player_input.lower() == "exit":
                     return False
                 else: 
                     column, row = map(int, player_input.split())
 
-                    if 1 <= row <= 3:
+                    if 1 <= row <= self.rows:
                         correct_row = True
-                    if 1 <= column <= 3:
+                    if 1 <= column <= self.columns:
                         correct_col = True
 
                     if not correct_row and not correct_col:
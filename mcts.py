@@ -0,0 +1,482 @@
+"""
+Monte Carlo tree search (MCTS) engine of the TicTacToe.
+
+An alternative to the minimax search of the AI for the boards where a full
+search is not feasible. Each iteration selects a leaf of the tree with UCT,
+adds one child and plays a random game from it. The nodes of the tree are kept
+in a pool of flat lists that is reused between the searches, and the subtree
+of the position reached after the moves of both players is kept for the next move.
+
+Compare the playouts per second with the nodes per second of minimax at the
+same time budget with:
+
+    python mcts.py --rows 7 --columns 7 --k 4 --time 1
+"""
+import argparse
+import math
+import random
+import time
+from typing import Callable, List, Optional
+
+from ai import AI, SearchStats
+from position import Board, Position, get_geometry
+
+
+# Iterations of each search when there is no budget
+DEFAULT_ITERATIONS = 10_000
+# Maximum number of nodes of the tree
+DEFAULT_MAX_NODES = 200_000
+# Exploration constant of UCT, sqrt(2) is the theoretical value for rewards in [0, 1]
+DEFAULT_EXPLORATION = math.sqrt(2)
+# Iterations between two checks of the time budget
+TIME_CHECK_INTERVAL = 64
+
+# Result of the game in a node
+UNFINISHED = -1
+TIE = 2
+NO_NODE = -1
+
+
+class MCTS:
+    """Monte Carlo tree search engine with UCT selection.
+
+    It has the same interface as the AI, so the game can use either of them.
+    The rewards are 1 for a win, 0.5 for a tie and 0 for a loss of the player
+    that made the move of each node.
+
+    Attributes
+    ----------
+    position : Position
+        The current position of the game.
+    iterations : int
+        The iterations of each search, None to use only the time limit.
+    time_limit : float
+        The seconds available for each move, None for no limit.
+    exploration : float
+        The exploration constant of UCT.
+    max_nodes : int
+        The maximum number of nodes of the tree.
+    playouts : int
+        The random games played in the last search.
+    playouts_per_second : float
+        The random games per second of the last search.
+    last_stats : SearchStats
+        The statistics of the last move chosen.
+    stats_callback : Callable[[SearchStats], None]
+        Called with the statistics of each move chosen, None to not report them.
+
+    Methods
+    -------
+    make_ai_move() -> bool
+        Make a move of the computer chosen by the tree search.
+    choose_move(player: int) -> Optional[int]
+        Get the best move of a player without making it or printing anything.
+    """
+
+    def __init__(self, position: Position, iterations: Optional[int] = None,
+                 time_limit: Optional[float] = None, exploration: float = DEFAULT_EXPLORATION,
+                 max_nodes: int = DEFAULT_MAX_NODES, seed: Optional[int] = None,
+                 stats_callback: Optional[Callable[[SearchStats], None]] = None) -> None:
+        """Initialize the engine with the current position in the game.
+
+        Args:
+            position (Position): The position.
+            iterations (int): The iterations of each search, by default DEFAULT_ITERATIONS
+                              if there is no time limit.
+            time_limit (float): The seconds available for each move.
+            exploration (float): The exploration constant of UCT.
+            max_nodes (int): The maximum number of nodes of the tree.
+            seed (int): The seed of the random games, None for a random seed.
+            stats_callback (Callable[[SearchStats], None]): Called with the statistics
+                                                            of each move chosen.
+
+        Raises:
+            ValueError: if the iterations are lower than 1 or the maximum number of
+                        nodes is lower than 2, the root and one child.
+        """
+        if iterations is None and time_limit is None:
+            iterations = DEFAULT_ITERATIONS
+        if iterations is not None and iterations < 1:
+            raise ValueError("The number of iterations must be at least 1")
+        if max_nodes < 2:
+            raise ValueError("The maximum number of nodes must be at least 2")
+        self.position = position
+        self.iterations = iterations
+        self.time_limit = time_limit
+        self.exploration = exploration
+        self.max_nodes = max_nodes
+        self.stats_callback = stats_callback
+        self.playouts = 0
+        self.playouts_per_second = 0.0
+        self.last_stats: Optional[SearchStats] = None
+        self._random = random.Random(seed).random
+
+        # Pool of nodes, the node i is the item i of each list
+        self._parent: List[int] = []
+        self._move: List[int] = []
+        self._player: List[int] = []
+        self._visits: List[int] = []
+        self._wins: List[float] = []
+        self._first_child: List[int] = []
+        self._next_sibling: List[int] = []
+        self._untried: List[int] = []
+        self._result: List[int] = []
+        self._size = 0
+        self._root = NO_NODE
+        self._root_board: Optional[Board] = None
+
+    def make_ai_move(self) -> bool:
+        """Make a move of the computer chosen by the tree search."""
+        best_move = self.choose_move()
+
+        # If there is no valid move
+        if best_move is None:
+            print("ERROR: No valid move found")
+            return False
+
+        # Generate a copy of the position to avoid changing the original position
+        # that can be shared with the game
+        board = self.position.board.copy()
+        board.make_move(best_move, 0)
+        self.position = Position.from_board(board)
+
+        print("\nComputer move:")
+        return True
+
+    def choose_move(self, player: int = 0) -> Optional[int]:
+        """Get the best move of a player without making it or printing anything.
+
+        The move is the most visited child of the root. The statistics of the
+        search are kept in last_stats and sent to the stats callback.
+
+        Args:
+            player (int): The player to move, 0 for the computer and 1 for the human player.
+
+        Returns:
+            int: The index of the best move.
+            None: If the game is finished.
+        """
+        start = time.perf_counter()
+        stats = SearchStats("mcts")
+        if not self.position.game_over:
+            self._set_root(self.position.board, player)
+            self.playouts = self._search(start)
+            best = self._best_child(self._root)
+            if best == NO_NODE:
+                # The pool filled before the root was expanded, any legal move
+                empty = self.position.board.empty_bits()
+                stats.move = (empty & -empty).bit_length() - 1
+            else:
+                stats.move = self._move[best]
+                stats.value = self._wins[best] / self._visits[best]
+            stats.nodes = self._size
+            stats.playouts = self.playouts
+        stats.elapsed = time.perf_counter() - start
+        self.playouts_per_second = self.playouts / stats.elapsed if stats.elapsed else 0.0
+
+        self.last_stats = stats
+        if self.stats_callback is not None:
+            self.stats_callback(stats)
+        return stats.move
+
+    def _new_node(self, parent: int, move: int, player: int, untried: int, result: int) -> int:
+        """Take a node from the pool.
+
+        Args:
+            parent (int): The parent node, NO_NODE for the root.
+            move (int): The move from the parent, -1 for the root.
+            player (int): The player that made the move.
+            untried (int): The bits of the moves without a child.
+            result (int): The winner, TIE or UNFINISHED.
+
+        Returns:
+            int: The index of the node.
+        """
+        node = self._size
+        self._size += 1
+        if node == len(self._parent):
+            self._parent.append(parent)
+            self._move.append(move)
+            self._player.append(player)
+            self._visits.append(0)
+            self._wins.append(0.0)
+            self._first_child.append(NO_NODE)
+            self._next_sibling.append(NO_NODE)
+            self._untried.append(untried)
+            self._result.append(result)
+        else:
+            self._parent[node] = parent
+            self._move[node] = move
+            self._player[node] = player
+            self._visits[node] = 0
+            self._wins[node] = 0.0
+            self._first_child[node] = NO_NODE
+            self._next_sibling[node] = NO_NODE
+            self._untried[node] = untried
+            self._result[node] = result
+        if parent != NO_NODE:
+            self._next_sibling[node] = self._first_child[parent]
+            self._first_child[parent] = node
+        return node
+
+    def _set_root(self, board: Board, player: int) -> None:
+        """Move the root to the node of a board, keeping its subtree if it's in the tree.
+
+        Args:
+            board (Board): The board of the new root.
+            player (int): The player to move.
+        """
+        node = self._find_descendant(board, player)
+        self._root_board = board.copy()
+        if node == NO_NODE:
+            self._size = 0
+            self._root = self._new_node(NO_NODE, -1, 1 - player, board.empty_bits(), UNFINISHED)
+            return
+        self._root = node
+        self._parent[node] = NO_NODE
+        self._compact()
+
+    def _find_descendant(self, board: Board, player: int) -> int:
+        """Get the node of the tree that reaches a board from the current root.
+
+        Args:
+            board (Board): The board to find.
+            player (int): The player to move in the board.
+
+        Returns:
+            int: The node, NO_NODE if the board is not in the tree.
+        """
+        root_board = self._root_board
+        if self._root == NO_NODE or root_board is None or root_board.geometry is not board.geometry:
+            return NO_NODE
+        # The new board must have all the marks of the root board
+        new_o = board.o_bits & ~root_board.o_bits
+        new_x = board.x_bits & ~root_board.x_bits
+        if board.o_bits & root_board.o_bits != root_board.o_bits or \
+                board.x_bits & root_board.x_bits != root_board.x_bits:
+            return NO_NODE
+        node = self._root
+        while new_o or new_x:
+            moved = 1 - self._player[node]
+            child = self._first_child[node]
+            while child != NO_NODE:
+                bit = 1 << self._move[child]
+                if (new_o if moved == 0 else new_x) & bit:
+                    break
+                child = self._next_sibling[child]
+            if child == NO_NODE:
+                return NO_NODE
+            if moved == 0:
+                new_o ^= 1 << self._move[child]
+            else:
+                new_x ^= 1 << self._move[child]
+            node = child
+        if 1 - self._player[node] != player:
+            return NO_NODE
+        return node
+
+    def _compact(self) -> None:
+        """Move the subtree of the root to the start of the pool, the rest of the nodes are free."""
+        old = (self._parent, self._move, self._player, self._visits, self._wins,
+               self._untried, self._result, self._first_child, self._next_sibling)
+        parent, move, player, visits, wins, untried, result, first_child, next_sibling = \
+            [list(values) for values in old]
+        self._size = 0
+        queue = [(self._root, NO_NODE)]
+        for node, new_parent in queue:
+            new_node = self._new_node(new_parent, move[node], player[node], untried[node], result[node])
+            self._visits[new_node] = visits[node]
+            self._wins[new_node] = wins[node]
+            child = first_child[node]
+            while child != NO_NODE:
+                queue.append((child, new_node))
+                child = next_sibling[child]
+        self._root = 0
+
+    def _search(self, start: float) -> int:
+        """Run the iterations of the search from the root.
+
+        Args:
+            start (float): The time when the search started.
+
+        Returns:
+            int: The number of iterations.
+        """
+        deadline = start + self.time_limit if self.time_limit is not None else float("inf")
+        limit = self.iterations if self.iterations is not None else float("inf")
+        board = self._root_board
+        geometry = board.geometry
+        square_lines = geometry.square_lines
+        full_mask = geometry.full_mask
+        parent = self._parent
+        move = self._move
+        player = self._player
+        visits = self._visits
+        wins = self._wins
+        first_child = self._first_child
+        next_sibling = self._next_sibling
+        untried = self._untried
+        result = self._result
+        exploration = self.exploration
+        random_float = self._random
+        squares = [0] * geometry.size
+        log = math.log
+        sqrt = math.sqrt
+
+        iterations = 0
+        while iterations < limit:
+            if iterations % TIME_CHECK_INTERVAL == 0 and time.perf_counter() > deadline and iterations:
+                break
+            iterations += 1
+            o_bits = board.o_bits
+            x_bits = board.x_bits
+
+            # Selection: descend through the fully expanded nodes with UCT
+            node = self._root
+            while result[node] == UNFINISHED and not untried[node] and first_child[node] != NO_NODE:
+                log_visits = log(visits[node])
+                best_score = -1.0
+                best = NO_NODE
+                child = first_child[node]
+                while child != NO_NODE:
+                    child_visits = visits[child]
+                    score = wins[child] / child_visits + exploration * sqrt(log_visits / child_visits)
+                    if score > best_score:
+                        best_score = score
+                        best = child
+                    child = next_sibling[child]
+                node = best
+                if player[node] == 0:
+                    o_bits |= 1 << move[node]
+                else:
+                    x_bits |= 1 << move[node]
+
+            # Expansion: add a child for a random move without one
+            if result[node] == UNFINISHED and untried[node] and self._size < self.max_nodes:
+                bits = untried[node]
+                for _ in range(int(random_float() * bits.bit_count())):
+                    bits &= bits - 1
+                square = (bits & -bits).bit_length() - 1
+                untried[node] ^= 1 << square
+                mover = 1 - player[node]
+                if mover == 0:
+                    o_bits |= 1 << square
+                    own = o_bits
+                else:
+                    x_bits |= 1 << square
+                    own = x_bits
+                outcome = UNFINISHED
+                for mask in square_lines[square]:
+                    if own & mask == mask:
+                        outcome = mover
+                        break
+                empty = full_mask & ~(o_bits | x_bits)
+                if outcome == UNFINISHED and not empty:
+                    outcome = TIE
+                node = self._new_node(node, square, mover, empty if outcome == UNFINISHED else 0, outcome)
+
+            # Simulation: play random moves until the end of the game
+            outcome = result[node]
+            if outcome == UNFINISHED:
+                outcome = self._playout(o_bits, x_bits, 1 - player[node], square_lines, full_mask,
+                                        random_float, squares)
+
+            # Backpropagation: each node is scored for the player that made its move
+            while node != NO_NODE:
+                visits[node] += 1
+                if outcome == player[node]:
+                    wins[node] += 1.0
+                elif outcome == TIE:
+                    wins[node] += 0.5
+                node = parent[node]
+        return iterations
+
+    @staticmethod
+    def _playout(o_bits: int, x_bits: int, mover: int, square_lines, full_mask: int,
+                 random_float: Callable[[], float], squares: List[int]) -> int:
+        """Play random moves until the end of the game.
+
+        It only changes the bits of the players and a list of squares reused by
+        all the playouts, so nothing is allocated or undone.
+
+        Args:
+            o_bits (int): The squares of the computer.
+            x_bits (int): The squares of the human player.
+            mover (int): The player to move.
+            square_lines (Tuple[Tuple[int, ...], ...]): The masks of the lines through each square.
+            full_mask (int): The bits of all the squares.
+            random_float (Callable[[], float]): The random generator.
+            squares (List[int]): A list with room for all the squares of the board.
+
+        Returns:
+            int: The winner or TIE.
+        """
+        empty = full_mask & ~(o_bits | x_bits)
+        remaining = 0
+        while empty:
+            lowest = empty & -empty
+            squares[remaining] = lowest.bit_length() - 1
+            remaining += 1
+            empty ^= lowest
+        while remaining:
+            # Take a random square and move the last one to its place
+            index = int(random_float() * remaining)
+            square = squares[index]
+            remaining -= 1
+            squares[index] = squares[remaining]
+            if mover == 0:
+                o_bits |= 1 << square
+                own = o_bits
+            else:
+                x_bits |= 1 << square
+                own = x_bits
+            for mask in square_lines[square]:
+                if own & mask == mask:
+                    return mover
+            mover = 1 - mover
+        return TIE
+
+    def _best_child(self, node: int) -> int:
+        """Get the most visited child of a node, NO_NODE if it has no children."""
+        best = NO_NODE
+        child = self._first_child[node]
+        while child != NO_NODE:
+            if best == NO_NODE or self._visits[child] > self._visits[best]:
+                best = child
+            child = self._next_sibling[child]
+        return best
+
+
+def compare(rows: int, columns: int, k: int, time_limit: float) -> None:
+    """Compare the tree search and minimax with the same time budget.
+
+    Args:
+        rows (int): The number of rows of the board.
+        columns (int): The number of columns of the board.
+        k (int): The number of marks in a row needed to win.
+        time_limit (float): The seconds available for the move.
+    """
+    geometry = get_geometry(rows, columns, k)
+    position = Position([None] * geometry.size, geometry)
+    position.make_move(geometry.size // 2, 1)
+
+    mcts = MCTS(position, time_limit=time_limit, seed=0)
+    move = mcts.choose_move()
+    print(f"MCTS:    move {move}, {mcts.playouts} playouts in {mcts.last_stats.elapsed:.2f}s "
+          f"({mcts.playouts_per_second:,.0f} playouts/s), {mcts.last_stats.nodes} nodes in the tree")
+
+    ai = AI(position, use_solved_table=False, depth=geometry.size, time_limit=time_limit)
+    move = ai.choose_move()
+    stats = ai.last_stats
+    print(f"Minimax: move {move}, {stats.nodes} nodes in {stats.elapsed:.2f}s "
+          f"({stats.nodes / stats.elapsed:,.0f} nodes/s), depth {len(ai.iterations)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the tree search and minimax")
+    parser.add_argument("--rows", type=int, default=7)
+    parser.add_argument("--columns", type=int, default=7)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--time", type=float, default=1.0, help="seconds for the move")
+    arguments = parser.parse_args()
+    compare(arguments.rows, arguments.columns, arguments.k, arguments.time)
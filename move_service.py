@@ -0,0 +1,274 @@
+"""
+Move service in front of the AI for many concurrent clients.
+
+Many clients ask for the move of the same board at the same time, above all in
+the openings. The service searches each board once: a query for a board that
+is already being searched waits for that search instead of starting another
+one (it's coalesced), and the moves are kept in a cache for the next queries.
+The boards are folded by their rotations and reflections, so the symmetric
+boards share the search and the entry of the cache, and the move is turned
+back to each board. The cache has a maximum number of entries, the least
+recently used is evicted first, and each entry expires after a time to live.
+
+The service can be used from threads with get_move and from asyncio with
+get_move_async, a thread and a coroutine asking for the same board share the
+same search.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, Future
+from typing import Callable, Dict, List, Optional, Tuple
+
+from ai import AI, new_table
+from position import Board, Geometry, Position, get_geometry
+from transposition import TranspositionTable, canonical_board
+
+
+# Transposition tables of each thread, the tables are not thread-safe
+_thread_tables = threading.local()
+
+
+def _thread_table(geometry: Geometry) -> TranspositionTable:
+    """Get the transposition table of the current thread for a board size.
+
+    Args:
+        geometry (Geometry): The lines of the board.
+
+    Returns:
+        TranspositionTable: The table of the thread.
+    """
+    tables = getattr(_thread_tables, "tables", None)
+    if tables is None:
+        tables = _thread_tables.tables = {}
+    if geometry not in tables:
+        tables[geometry] = new_table(geometry)
+    return tables[geometry]
+
+
+def compute_ai_move(o_bits: int, x_bits: int, rows: int, columns: int, k: int) -> Optional[int]:
+    """Get the move of the AI in a board.
+
+    It only takes integers, so it can run in a thread or in a process pool.
+
+    Args:
+        o_bits (int): The squares occupied by the computer.
+        x_bits (int): The squares occupied by the human player.
+        rows (int): The number of rows of the board.
+        columns (int): The number of columns of the board.
+        k (int): The number of marks in a row needed to win.
+
+    Returns:
+        int: The index of the move of the AI.
+        None: If the game is finished.
+    """
+    geometry = get_geometry(rows, columns, k)
+    board = Board(o_bits, x_bits, geometry)
+    return AI(Position.from_board(board), _thread_table(geometry)).choose_move()
+
+
+class MoveService:
+    """Search the moves of the AI once for all the concurrent queries of a board.
+
+    Attributes
+    ----------
+    max_entries : int
+        The maximum number of moves in the cache.
+    ttl : float
+        The seconds that a move is kept in the cache.
+    hits : int
+        The queries answered from the cache.
+    coalesced : int
+        The queries that waited for the search of another query.
+    misses : int
+        The queries that started a search.
+
+    Methods
+    -------
+    get_move(board: Board) -> Optional[int]
+        Get the move of the AI in a board, searching it in this thread if needed.
+    get_move_async(board: Board, executor: Optional[Executor]) -> Optional[int]
+        Get the move of the AI in a board, searching it in an executor if needed.
+    metrics() -> Dict[str, float]
+        Get the counters of the queries and the size of the cache.
+    clear() -> None
+        Remove all the moves of the cache and reset the counters.
+    """
+
+    def __init__(self, max_entries: int = 10_000, ttl: float = 600.0,
+                 compute: Callable[[int, int, int, int, int], Optional[int]] = compute_ai_move) -> None:
+        """Initialize the service with an empty cache.
+
+        Args:
+            max_entries (int): The maximum number of moves in the cache.
+            ttl (float): The seconds that a move is kept in the cache.
+            compute (Callable[[int, int, int, int, int], Optional[int]]): The search
+                of a move from the bits of the players and the size of the board,
+                like compute_ai_move. It must be a module function to run in a
+                process pool.
+
+        Raises:
+            ValueError: if the size or the time to live are not positive.
+        """
+        if max_entries < 1:
+            raise ValueError("The size of the cache must be positive")
+        if ttl <= 0:
+            raise ValueError("The time to live must be positive")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self._compute = compute
+        self._lock = threading.Lock()
+        # The time each move expires and the move on the canonical board
+        self._cache: "OrderedDict[Tuple[Geometry, int], Tuple[float, Optional[int]]]" = OrderedDict()
+        # The searches in progress, their result is the move on the canonical board
+        self._in_flight: Dict[Tuple[Geometry, int], Future] = {}
+
+    def _query(self, board: Board) -> Tuple[Tuple[Geometry, int], List[int], Future, bool]:
+        """Find the move of a board in the cache or in the searches in progress.
+
+        Args:
+            board (Board): The board with the computer to move.
+
+        Returns:
+            Tuple[Tuple[Geometry, int], List[int], Future, bool]: The key of the
+                board, the square where each square goes in the canonical board,
+                the future of the move on the canonical board and True if the
+                caller must search it and finish the future.
+        """
+        code, targets = canonical_board(board)
+        key = (board.geometry, code)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._cache.move_to_end(key)
+                    self.hits += 1
+                    future: Future = Future()
+                    future.set_result(entry[1])
+                    return key, targets, future, False
+                del self._cache[key]
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return key, targets, future, False
+            self.misses += 1
+            future = self._in_flight[key] = Future()
+            return key, targets, future, True
+
+    def _finish(self, key: Tuple[Geometry, int], future: Future, targets: List[int],
+                result: Future) -> None:
+        """Store the move of a search and give it to the queries that wait for it.
+
+        Args:
+            key (Tuple[Geometry, int]): The key of the board.
+            future (Future): The future of the queries of the board.
+            targets (List[int]): The square where each square of the searched
+                                 board goes in the canonical board.
+            result (Future): The finished search, its move is on the searched board.
+        """
+        error = asyncio.CancelledError() if result.cancelled() else result.exception()
+        move = None
+        if error is None and result.result() is not None:
+            move = targets[result.result()]
+        with self._lock:
+            del self._in_flight[key]
+            # A failed search isn't cached, the next query searches again
+            if error is None:
+                self._cache[key] = (time.monotonic() + self.ttl, move)
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+        if error is None:
+            future.set_result(move)
+        else:
+            future.set_exception(error)
+
+    @staticmethod
+    def _to_board(move: Optional[int], targets: List[int]) -> Optional[int]:
+        """Turn a move of the canonical board into the move of a board."""
+        return None if move is None else targets.index(move)
+
+    def get_move(self, board: Board) -> Optional[int]:
+        """Get the move of the AI in a board, searching it in this thread if needed.
+
+        Args:
+            board (Board): The board with the computer to move, it's not changed.
+
+        Returns:
+            int: The index of the move of the AI.
+            None: If the game is finished.
+        """
+        key, targets, future, search = self._query(board)
+        if search:
+            geometry = board.geometry
+            result: Future = Future()
+            try:
+                result.set_result(self._compute(board.o_bits, board.x_bits, geometry.rows,
+                                                geometry.columns, geometry.k))
+            except Exception as error:
+                result.set_exception(error)
+            self._finish(key, future, targets, result)
+        return self._to_board(future.result(), targets)
+
+    async def get_move_async(self, board: Board, executor: Optional[Executor] = None) -> Optional[int]:
+        """Get the move of the AI in a board, searching it in an executor if needed.
+
+        Args:
+            board (Board): The board with the computer to move, it's not changed.
+            executor (Executor): The executor of the search, by default the one
+                                 of the event loop.
+
+        Returns:
+            int: The index of the move of the AI.
+            None: If the game is finished.
+        """
+        key, targets, future, search = self._query(board)
+        if search:
+            geometry = board.geometry
+            try:
+                result = asyncio.get_running_loop().run_in_executor(
+                    executor, self._compute, board.o_bits, board.x_bits,
+                    geometry.rows, geometry.columns, geometry.k)
+            except Exception as error:
+                # The executor refused the search (shut down or broken), the
+                # queries that wait for it get the error
+                failed: Future = Future()
+                failed.set_exception(error)
+                self._finish(key, future, targets, failed)
+            else:
+                # The move is stored even if this query is cancelled while it waits
+                result.add_done_callback(lambda done: self._finish(key, future, targets, done))
+        # A cancelled query doesn't cancel the search that other queries wait for
+        move = await asyncio.shield(asyncio.wrap_future(future))
+        return self._to_board(move, targets)
+
+    def metrics(self) -> Dict[str, float]:
+        """Get the counters of the queries and the size of the cache.
+
+        Returns:
+            Dict[str, float]: The hits, the coalesced queries, the misses, the
+                fraction of the queries that didn't search, the moves in the
+                cache and the searches in progress.
+        """
+        with self._lock:
+            queries = self.hits + self.coalesced + self.misses
+            return {
+                "hits": self.hits,
+                "coalesced": self.coalesced,
+                "misses": self.misses,
+                "saved_rate": (self.hits + self.coalesced) / queries if queries else 0.0,
+                "entries": len(self._cache),
+                "in_flight": len(self._in_flight),
+            }
+
+    def clear(self) -> None:
+        """Remove all the moves of the cache and reset the counters."""
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.coalesced = 0
+            self.misses = 0
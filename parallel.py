@@ -0,0 +1,287 @@
+"""
+Search the moves of the root position in parallel across a pool of processes.
+
+The first move is searched in the main process to get a bound (young brothers
+wait), then the rest of the moves are searched by the workers. The best value
+found so far is shared by all the workers, so each new search starts with the
+highest alpha known. Each process keeps one AI for each board size, so its
+transposition table and move ordering heuristics are reused by the next
+searches. With a single CPU or a few root moves the processes cost more than
+they save, so the root is searched serially in the main process.
+
+Run the benchmark that compares the serial and the parallel search with:
+
+    python parallel.py --workers 4
+"""
+import argparse
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from ai import AI
+from position import Board, Geometry, Position, get_geometry
+from transposition import TranspositionTable
+
+
+# Root moves below which the root is searched serially, the workers don't
+# have enough moves to share
+MIN_PARALLEL_MOVES = 8
+
+# Best value of the root in each worker process, set by the pool initializer
+_shared_alpha = None
+
+# AI of each board size in the process, kept for all the searches
+_process_ais: Dict[Geometry, AI] = {}
+
+
+def _init_worker(shared_alpha) -> None:
+    """Keep the value shared by the workers in the worker process.
+
+    Args:
+        shared_alpha (multiprocessing.Value): The best value of the root found so far.
+    """
+    global _shared_alpha
+    _shared_alpha = shared_alpha
+
+
+def _update_alpha(shared_alpha, value: float) -> None:
+    """Raise the shared alpha if the value is greater.
+
+    Args:
+        shared_alpha (multiprocessing.Value): The best value of the root found so far.
+        value (float): The exact value of a root move.
+    """
+    with shared_alpha.get_lock():
+        if value > shared_alpha.value:
+            shared_alpha.value = value
+
+
+def _process_ai(geometry: Geometry) -> AI:
+    """Get the AI of the current process for a board size.
+
+    Args:
+        geometry (Geometry): The lines of the board.
+
+    Returns:
+        AI: The AI, its table is the one shared in the process.
+    """
+    ai = _process_ais.get(geometry)
+    if ai is None:
+        ai = _process_ais[geometry] = AI(Position([None] * geometry.size, geometry),
+                                         use_solved_table=False)
+    return ai
+
+
+def _ping() -> None:
+    """Do nothing, it's used to start the worker processes."""
+
+
+def _search_move(o_bits: int, x_bits: int, rows: int, columns: int, k: int,
+                 move: int, depth: int) -> Tuple[int, float, bool, int]:
+    """Search a move of the computer in the root position.
+
+    The window starts one point below the shared alpha, so every move that ties
+    the best value gets its exact value and the result doesn't depend on the
+    order in which the workers finish.
+
+    Args:
+        o_bits (int): The squares occupied by the computer.
+        x_bits (int): The squares occupied by the human player.
+        rows (int): The number of rows of the board.
+        columns (int): The number of columns of the board.
+        k (int): The number of marks in a row needed to win.
+        move (int): The move of the computer to search.
+        depth (int): The depth of the root position.
+
+    Returns:
+        Tuple[int, float, bool, int]: The move, its value, True if the value is
+            exact (False if it's only an upper bound) and the nodes visited.
+    """
+    geometry = get_geometry(rows, columns, k)
+    board = Board(o_bits, x_bits, geometry)
+    board.make_move(move, 0)
+    ai = _process_ai(geometry)
+    nodes = ai.nodes
+    alpha = _shared_alpha.value - 1
+    value = ai.search(board, depth - 1, False, alpha, float('inf'), 1)
+    exact = value > alpha
+    if exact:
+        _update_alpha(_shared_alpha, value)
+    return move, value, exact, ai.nodes - nodes
+
+
+class ParallelSearch:
+    """Search the moves of the root position in parallel across a pool of processes.
+
+    Each worker keeps its own AI and transposition table for all the searches of
+    the pool, the processes are only started when a root is searched in parallel.
+    The values of the evaluation are integers, this is needed to know which moves
+    tie the best value. The workers share one bound, so the searches of a pool
+    run one at a time: a search started from another thread waits for the
+    current one to finish.
+
+    Attributes
+    ----------
+    workers : int
+        The number of worker processes.
+    nodes : int
+        The nodes visited by all the processes in the last search.
+
+    Methods
+    -------
+    search(position: Position, depth: int, ai: Optional[AI]) -> Tuple[float, Optional[int]]
+        Get the value and the best move of the computer.
+    warm_up() -> None
+        Start all the worker processes.
+    close() -> None
+        Shut down the worker processes.
+    """
+
+    def __init__(self, workers: Optional[int] = None) -> None:
+        """Start the pool of worker processes.
+
+        Args:
+            workers (int): The number of worker processes, by default the number of CPUs.
+
+        Raises:
+            ValueError: if the number of workers is lower than 1.
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers < 1:
+            raise ValueError("The number of workers must be at least 1")
+        self.workers = workers
+        self.nodes = 0
+        self._shared_alpha = multiprocessing.Value("d", float("-inf"))
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # Held during a search, the shared alpha belongs to a single root
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        """Get the pool of worker processes, it's started the first time."""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                 initargs=(self._shared_alpha,))
+        return self._executor
+
+    def search(self, position: Position, depth: int, ai: Optional[AI] = None) -> Tuple[float, Optional[int]]:
+        """Get the value and the best move of the computer.
+
+        The moves are sorted as in the serial search, the first one is searched
+        in this process and the rest by the workers. The best move is the first
+        one in that order with the greatest value, the same as the serial search.
+        With one worker, one CPU or fewer than MIN_PARALLEL_MOVES moves the whole
+        root is searched in this process. The concurrent calls are serialized.
+
+        Args:
+            position (Position): The current position, the computer moves next.
+            depth (int): The depth of the tree.
+            ai (AI): The AI that searches in this process, with its table and
+                     heuristics. By default the AI of this process for the board size.
+
+        Returns:
+            Tuple[float, Optional[int]]: The evaluation of the position and the index
+                                         of the best move, None if there is no move.
+        """
+        with self._lock:
+            return self._search(position, depth, ai)
+
+    def _search(self, position: Position, depth: int, ai: Optional[AI]) -> Tuple[float, Optional[int]]:
+        """Search the root while holding the lock, see search."""
+        if depth == 0 or position.game_over:
+            self.nodes = 0
+            return position.evaluation, None
+
+        board = position.board
+        geometry = board.geometry
+        if ai is None:
+            ai = _process_ai(geometry)
+        nodes = ai.nodes
+        moves = ai.order_moves(board, 0)
+        if self.workers == 1 or (os.cpu_count() or 1) == 1 or len(moves) < MIN_PARALLEL_MOVES:
+            result = ai.minimax(position, depth, True)
+            self.nodes = ai.nodes - nodes
+            return result
+
+        # Young brothers wait: the first move gives the bound of the rest
+        first_board = board.copy()
+        first_board.make_move(moves[0], 0)
+        best_value = ai.search(first_board, depth - 1, False, float("-inf"), float("inf"), 1)
+        self._shared_alpha.value = best_value
+        self.nodes = ai.nodes - nodes
+
+        futures = [self._pool().submit(_search_move, board.o_bits, board.x_bits, geometry.rows,
+                                       geometry.columns, geometry.k, move, depth)
+                   for move in moves[1:]]
+        results: List[Tuple[int, float, bool, int]] = [future.result() for future in futures]
+
+        # Merge in the order of the moves, so the result doesn't depend on the timing
+        best_move = moves[0]
+        for move, value, exact, nodes in results:
+            self.nodes += nodes
+            if exact and value > best_value:
+                best_value = value
+                best_move = move
+        return best_value, best_move
+
+    def warm_up(self) -> None:
+        """Start all the worker processes, so the first search doesn't wait for them."""
+        for future in [self._pool().submit(_ping) for _ in range(self.workers)]:
+            future.result()
+
+    def close(self) -> None:
+        """Shut down the worker processes."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self) -> "ParallelSearch":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def benchmark(workers: Optional[int] = None) -> None:
+    """Compare the serial and the parallel search on boards bigger than 3x3.
+
+    Args:
+        workers (int): The number of worker processes, by default the number of CPUs.
+    """
+    cases = [((4, 4, 3), 7), ((5, 5, 4), 5), ((6, 6, 4), 4)]
+    for (rows, columns, k), depth in cases:
+        geometry = get_geometry(rows, columns, k)
+        position = Position([None] * geometry.size, geometry)
+
+        ai = AI(position, table=TranspositionTable(), use_solved_table=False, depth=depth)
+        start = time.perf_counter()
+        serial_move = ai.choose_move()
+        serial_time = time.perf_counter() - start
+        serial_value = ai.last_stats.value
+
+        # A new pool for each board, so the workers start with empty tables
+        with ParallelSearch(workers) as parallel:
+            parallel.warm_up()
+            parallel_ai = AI(position, table=TranspositionTable(), use_solved_table=False,
+                             depth=depth, parallel=parallel)
+            start = time.perf_counter()
+            parallel_move = parallel_ai.choose_move()
+            parallel_time = time.perf_counter() - start
+            parallel_value = parallel_ai.last_stats.value
+            workers_used = parallel.workers
+
+        print(f"{rows}x{columns} k={k} depth {depth}: "
+              f"serial {serial_time:.3f}s ({ai.nodes} nodes, move {serial_move}, value {serial_value}) | "
+              f"parallel x{workers_used} {parallel_time:.3f}s ({parallel.nodes} nodes, "
+              f"move {parallel_move}, value {parallel_value}) | "
+              f"speedup {serial_time / parallel_time:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the serial and the parallel search")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of worker processes, by default the number of CPUs")
+    benchmark(parser.parse_args().workers)
@@ -0,0 +1,315 @@
+"""
+Enumeration of the game tree of TicTacToe, like the perft of chess engines.
+
+Counts at each ply from a starting position the nodes of the game tree, the
+games that end at that ply by outcome and the unique boards. The counts of the
+empty classic board are well known (255168 games and 5478 boards), so they
+check the move generation of Board after every change, and the enumeration of
+the full tree measures its raw speed.
+
+The tree can be walked move by move, or a ply at a time merging the
+transpositions (the same board reached by moves in another order) or also the
+rotations and reflections of the board. A merged board keeps the number of
+paths that reach it, so the counts of nodes and games don't change, only the
+work and the meaning of the unique boards. The root moves can be counted in
+parallel processes:
+
+    python perft.py --rows 3 --columns 3 --k 3 --dedup symmetry --workers 4
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from position import Board, Geometry, Position, get_geometry
+from transposition import canonical_board
+
+
+# How the boards are merged: 'none' walks every path of the tree, 'transposition'
+# merges the same boards and 'symmetry' also merges the symmetric boards
+DEDUP_MODES = ("none", "transposition", "symmetry")
+
+
+@dataclass
+class PlyCounts:
+    """Counts of one ply of the game tree.
+
+    Attributes
+    ----------
+    ply : int
+        The number of moves from the starting position.
+    nodes : int
+        The paths of the tree that reach the ply.
+    o_wins : int
+        The games won by the computer (O) in its last move at the ply.
+    x_wins : int
+        The games won by the human player (X) in its last move at the ply.
+    ties : int
+        The games that end in a tie at the ply.
+    unique : int
+        The different boards at the ply, the symmetric boards count as one
+        with the 'symmetry' deduplication.
+    """
+    ply: int
+    nodes: int = 0
+    o_wins: int = 0
+    x_wins: int = 0
+    ties: int = 0
+    unique: int = 0
+
+    @property
+    def games(self) -> int:
+        """Get the games that end at the ply."""
+        return self.o_wins + self.x_wins + self.ties
+
+
+def board_key(board: Board) -> int:
+    """Get the code of a board, both players in one number."""
+    return board.o_bits << board.geometry.size | board.x_bits
+
+
+def symmetric_key(board: Board) -> int:
+    """Get the code shared by a board and its rotations and reflections."""
+    return canonical_board(board)[0]
+
+
+def _walk(board: Board, player: int, ply: int, depth: int, weight: int,
+          counts: List[List[int]], states: List[Set[int]], key: Callable[[Board], int]) -> None:
+    """Count the subtree of a board move by move.
+
+    Args:
+        board (Board): The board, the moves are made and undone in it.
+        player (int): The player to move.
+        ply (int): The ply of the board.
+        depth (int): The last ply counted.
+        weight (int): The paths that reach the board.
+        counts (List[List[int]]): The nodes, wins of O, wins of X and ties of each ply.
+        states (List[Set[int]]): The keys of the boards of each ply.
+        key (Callable[[Board], int]): The key of a board.
+    """
+    row = counts[ply + 1]
+    seen = states[ply + 1]
+    # The board is full after the move
+    full = board.empty_count() == 1
+    for move in board.possible_moves():
+        won = board.make_move(move, player)
+        row[0] += weight
+        seen.add(key(board))
+        if won:
+            row[1 + player] += weight
+        elif full:
+            row[3] += weight
+        elif ply + 1 < depth:
+            _walk(board, 1 - player, ply + 1, depth, weight, counts, states, key)
+        board.undo_move(move, player)
+
+
+def _layers(board: Board, player: int, ply: int, depth: int, weight: int,
+            counts: List[List[int]], states: List[Set[int]], key: Callable[[Board], int]) -> None:
+    """Count the subtree of a board a ply at a time, merging the boards with the same key.
+
+    Args:
+        board (Board): The board, it's not changed.
+        player (int): The player to move.
+        ply (int): The ply of the board.
+        depth (int): The last ply counted.
+        weight (int): The paths that reach the board.
+        counts (List[List[int]]): The nodes, wins of O, wins of X and ties of each ply.
+        states (List[Set[int]]): The keys of the boards of each ply.
+        key (Callable[[Board], int]): The key of a board, the boards with the same
+                                      key have the same subtree.
+    """
+    geometry = board.geometry
+    # The bits of a board of each key and the paths that reach it
+    layer: Dict[int, List[int]] = {key(board): [board.o_bits, board.x_bits, weight]}
+    while layer and ply < depth:
+        row = counts[ply + 1]
+        seen = states[ply + 1]
+        next_layer: Dict[int, List[int]] = {}
+        for o_bits, x_bits, paths in layer.values():
+            board = Board(o_bits, x_bits, geometry)
+            full = board.empty_count() == 1
+            for move in board.possible_moves():
+                won = board.make_move(move, player)
+                code = key(board)
+                row[0] += paths
+                seen.add(code)
+                if won:
+                    row[1 + player] += paths
+                elif full:
+                    row[3] += paths
+                else:
+                    entry = next_layer.get(code)
+                    if entry is None:
+                        next_layer[code] = [board.o_bits, board.x_bits, paths]
+                    else:
+                        entry[2] += paths
+                board.undo_move(move, player)
+        layer = next_layer
+        player = 1 - player
+        ply += 1
+
+
+def count_tree(board: Board, player: int, depth: int, dedup: str = "none",
+               weight: int = 1, ply: int = 0) -> Tuple[List[List[int]], List[Set[int]]]:
+    """Count the game tree of a board in this process.
+
+    Args:
+        board (Board): The board, it's not changed.
+        player (int): The player to move.
+        depth (int): The last ply counted.
+        dedup (str): 'none', 'transposition' or 'symmetry'.
+        weight (int): The paths that reach the board.
+        ply (int): The ply of the board.
+
+    Returns:
+        Tuple[List[List[int]], List[Set[int]]]: The nodes, wins of O, wins of X
+            and ties of each ply and the keys of the boards of each ply.
+    """
+    key = symmetric_key if dedup == "symmetry" else board_key
+    counts = [[0, 0, 0, 0] for _ in range(depth + 1)]
+    states: List[Set[int]] = [set() for _ in range(depth + 1)]
+    counts[ply][0] = weight
+    states[ply].add(key(board))
+    status = board.status()
+    if status is not None:
+        if status == "tie":
+            counts[ply][3] = weight
+        else:
+            counts[ply][1 + status] = weight
+    elif ply < depth:
+        if dedup == "none":
+            _walk(board.copy(), player, ply, depth, weight, counts, states, key)
+        else:
+            _layers(board, player, ply, depth, weight, counts, states, key)
+    return counts, states
+
+
+def _count_subtree(o_bits: int, x_bits: int, rows: int, columns: int, k: int, player: int,
+                   depth: int, dedup: str, weight: int) -> Tuple[List[List[int]], List[Set[int]]]:
+    """Count the game tree of a root move in a worker process, see count_tree."""
+    board = Board(o_bits, x_bits, get_geometry(rows, columns, k))
+    return count_tree(board, player, depth, dedup, weight, ply=1)
+
+
+def perft(position: Position, player: int = 1, depth: Optional[int] = None,
+          dedup: str = "none", workers: int = 1) -> List[PlyCounts]:
+    """Count the nodes, the finished games and the unique boards of each ply.
+
+    With the 'symmetry' deduplication the root moves that give symmetric
+    boards are counted once.
+
+    Args:
+        position (Position): The starting position, it's not changed.
+        player (int): The player to move, 0 for the computer (O) and 1 for the human player (X).
+        depth (int): The last ply counted, until the end of the games if it's None.
+        dedup (str): 'none', 'transposition' or 'symmetry'.
+        workers (int): The processes that count the root moves, 1 to count in this process.
+
+    Returns:
+        List[PlyCounts]: The counts of each ply that has nodes, from the starting position.
+
+    Raises:
+        ValueError: if the deduplication is unknown or the depth is negative.
+    """
+    if dedup not in DEDUP_MODES:
+        raise ValueError(f"Unknown deduplication: {dedup}")
+    board = position.board
+    if depth is None:
+        depth = board.empty_count()
+    if depth < 0:
+        raise ValueError("The depth must be positive")
+
+    if workers <= 1 or depth == 0 or board.status() is not None:
+        counts, states = count_tree(board, player, depth, dedup)
+    else:
+        key = symmetric_key if dedup == "symmetry" else board_key
+        counts = [[0, 0, 0, 0] for _ in range(depth + 1)]
+        states = [set() for _ in range(depth + 1)]
+        counts[0][0] = 1
+        states[0].add(key(board))
+        # The boards after each root move and how many moves give them
+        roots: Dict[int, List[int]] = {}
+        child = board.copy()
+        for move in child.possible_moves():
+            child.make_move(move, player)
+            code = key(child) if dedup == "symmetry" else move
+            entry = roots.setdefault(code, [child.o_bits, child.x_bits, 0])
+            entry[2] += 1
+            child.undo_move(move, player)
+        geometry = board.geometry
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_count_subtree, o_bits, x_bits, geometry.rows, geometry.columns,
+                                       geometry.k, 1 - player, depth, dedup, weight)
+                       for o_bits, x_bits, weight in roots.values()]
+            for future in futures:
+                subtree_counts, subtree_states = future.result()
+                for ply in range(1, depth + 1):
+                    counts[ply] = [total + count for total, count in zip(counts[ply], subtree_counts[ply])]
+                    states[ply] |= subtree_states[ply]
+
+    return [PlyCounts(ply, *counts[ply], len(states[ply]))
+            for ply in range(depth + 1) if counts[ply][0]]
+
+
+def parse_board(text: str, geometry: Geometry) -> Position:
+    """Get a position from the marks of its squares.
+
+    Args:
+        text (str): 'X', 'O' or '.' for each square, row by row.
+        geometry (Geometry): The lines of the board.
+
+    Returns:
+        Position: The position.
+
+    Raises:
+        ValueError: if the text doesn't have a valid mark for each square.
+    """
+    marks = {"o": 0, "x": 1, ".": None}
+    if len(text) != geometry.size or any(mark not in marks for mark in text.lower()):
+        raise ValueError(f"The board must have {geometry.size} marks of 'X', 'O' or '.'")
+    return Position([marks[mark] for mark in text.lower()], geometry)
+
+
+def main() -> None:
+    """Count the game tree from the command line."""
+    parser = argparse.ArgumentParser(description="Count the game tree of TicTacToe")
+    parser.add_argument("--rows", type=int, default=3)
+    parser.add_argument("--columns", type=int, default=3)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--board", default=None,
+                        help="starting board, 'X', 'O' or '.' for each square row by row")
+    parser.add_argument("--player", type=int, choices=(0, 1), default=1,
+                        help="player to move, 0 for O and 1 for X")
+    parser.add_argument("--depth", type=int, default=None, help="last ply, by default the end of the games")
+    parser.add_argument("--dedup", choices=DEDUP_MODES, default="none")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes that count the root moves, 0 for the number of CPUs")
+    arguments = parser.parse_args()
+
+    geometry = get_geometry(arguments.rows, arguments.columns, arguments.k)
+    if arguments.board is None:
+        position = Position([None] * geometry.size, geometry)
+    else:
+        position = parse_board(arguments.board, geometry)
+    workers = arguments.workers or os.cpu_count() or 1
+
+    start = time.perf_counter()
+    plies = perft(position, arguments.player, arguments.depth, arguments.dedup, workers)
+    elapsed = time.perf_counter() - start
+
+    print(f"{'ply':>3} {'nodes':>14} {'O wins':>12} {'X wins':>12} {'ties':>12} {'unique':>12}")
+    for counts in plies:
+        print(f"{counts.ply:>3} {counts.nodes:>14} {counts.o_wins:>12} {counts.x_wins:>12} "
+              f"{counts.ties:>12} {counts.unique:>12}")
+    nodes = sum(counts.nodes for counts in plies)
+    print(f"{'all':>3} {nodes:>14} {sum(counts.o_wins for counts in plies):>12} "
+          f"{sum(counts.x_wins for counts in plies):>12} {sum(counts.ties for counts in plies):>12} "
+          f"{sum(counts.unique for counts in plies):>12}")
+    print(f"{elapsed:.3f}s, {nodes / elapsed:,.0f} nodes/s")
+
+
+if __name__ == "__main__":
+    main()
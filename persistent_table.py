@@ -0,0 +1,311 @@
+"""
+Transposition table backed by a file shared by many processes.
+
+The entries of the searches are kept in a SQLite database, so a new process
+loads the positions already searched by the previous ones instead of starting
+with an empty table. Many processes can read and write the same file at the
+same time. The entries near the horizon are cheap to search again and are only
+kept in memory, and the file is capped by removing the shallowest entries.
+
+Fill a cache by playing the AI against itself before starting the workers with:
+
+    python persistent_table.py warm --path cache.db --rows 4 --columns 4 --k 3 --games 20
+
+and enable it in a process with ai.enable_persistent_cache('cache.db') or the
+TICTACTOE_CACHE environment variable.
+"""
+import argparse
+import atexit
+import random
+import sqlite3
+import time
+from typing import List, Optional, Tuple
+
+from position import EVALUATION_VERSION, Board, Geometry, get_geometry
+from transposition import TranspositionTable
+
+
+# Entries written to the file at a time
+FLUSH_SIZE = 1000
+# Maximum number of entries of the file
+DEFAULT_MAX_ENTRIES = 1_000_000
+# Entries searched with a lower depth are not written to the file
+DEFAULT_MIN_DEPTH = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    board INTEGER NOT NULL,
+    key BLOB NOT NULL,
+    depth INTEGER NOT NULL,
+    value REAL NOT NULL,
+    flag INTEGER NOT NULL,
+    PRIMARY KEY (board, key)
+)
+"""
+
+
+def board_id(geometry: Geometry) -> int:
+    """Get the number that identifies the size of a board in the file.
+
+    Args:
+        geometry (Geometry): The lines of the board.
+
+    Returns:
+        int: The rows, columns and marks in a row packed in one number.
+    """
+    return geometry.rows << 16 | geometry.columns << 8 | geometry.k
+
+
+def _key_to_bytes(key: int) -> bytes:
+    """Get the bytes of a canonical key, they can be longer than 64 bits."""
+    return key.to_bytes((key.bit_length() + 7) // 8 or 1, "little")
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """Open the database of the cache and create its table.
+
+    The version of the evaluation is kept in the user_version of the file,
+    the entries written with another version are deleted.
+
+    Args:
+        path (str): The path of the file.
+
+    Returns:
+        sqlite3.Connection: The connection.
+    """
+    # A table is used by one thread, but it can be closed by another one at exit
+    connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    # Readers don't wait for the writers of other processes
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    # Locked so another process doesn't write old entries while they're deleted
+    connection.execute("BEGIN IMMEDIATE")
+    if connection.execute("PRAGMA user_version").fetchone()[0] != EVALUATION_VERSION:
+        connection.execute("DROP TABLE IF EXISTS entries")
+        connection.execute(f"PRAGMA user_version = {EVALUATION_VERSION}")
+    connection.execute(SCHEMA)
+    connection.commit()
+    return connection
+
+
+class PersistentTable(TranspositionTable):
+    """Transposition table that loads and saves its entries in a file.
+
+    The entries are loaded from the file when the table is created, the
+    deepest first, and the new entries are written in batches. An entry of
+    the file is only replaced by a search of the same or greater depth.
+
+    Attributes
+    ----------
+    path : str
+        The path of the file.
+    geometry : Geometry
+        The lines of the board of the positions.
+    max_entries : int
+        The maximum number of entries of the file for all the board sizes.
+    min_depth : int
+        The lowest depth of the entries written to the file.
+    loaded : int
+        The entries loaded from the file.
+
+    Methods
+    -------
+    flush() -> None
+        Write the pending entries to the file.
+    sync() -> None
+        Write the pending entries and load the ones added by other processes.
+    close() -> None
+        Write the pending entries and close the file.
+    """
+
+    def __init__(self, path: str, geometry: Geometry, max_size: int = 100_000,
+                 replacement: str = "lru", max_entries: int = DEFAULT_MAX_ENTRIES,
+                 min_depth: int = DEFAULT_MIN_DEPTH) -> None:
+        """Open the file and load its entries.
+
+        Args:
+            path (str): The path of the file, it's created if it doesn't exist.
+            geometry (Geometry): The lines of the board of the positions.
+            max_size (int): The maximum number of entries in memory.
+            replacement (str): The eviction policy in memory, 'lru' or 'depth'.
+            max_entries (int): The maximum number of entries of the file.
+            min_depth (int): The lowest depth of the entries written to the file.
+
+        Raises:
+            ValueError: if a size is not positive or the policy is unknown.
+        """
+        super().__init__(max_size, replacement)
+        if max_entries < 1:
+            raise ValueError("The size of the file must be positive")
+        self.path = path
+        self.geometry = geometry
+        self.max_entries = max_entries
+        self.min_depth = min_depth
+        self.loaded = 0
+        self._board = board_id(geometry)
+        self._pending: List[Tuple[int, bytes, int, float, int]] = []
+        self._last_row = 0
+        self._connection: Optional[sqlite3.Connection] = connect(path)
+        self._load("ORDER BY depth DESC LIMIT ?", (max_size,))
+        atexit.register(self.close)
+
+    def _load(self, condition: str, parameters: tuple) -> None:
+        """Load the entries of the board that match a condition."""
+        rows = self._connection.execute(
+            f"SELECT rowid, key, depth, value, flag FROM entries WHERE board = ? {condition}",
+            (self._board, *parameters))
+        # The deepest entries are stored last, so they are the last evicted
+        for row, key, depth, value, flag in reversed(rows.fetchall()):
+            # Stored without queuing them to be written again
+            super().store(int.from_bytes(key, "little"), depth, value, flag)
+            self._last_row = max(self._last_row, row)
+            self.loaded += 1
+
+    def store(self, key: int, depth: int, value: float, flag: int) -> None:
+        """Save the result of a search in memory and queue it to be written.
+
+        Args:
+            key (int): The canonical key of the position.
+            depth (int): The depth searched from the position.
+            value (float): The evaluation of the position.
+            flag (int): EXACT, LOWER_BOUND or UPPER_BOUND.
+        """
+        super().store(key, depth, value, flag)
+        if depth >= self.min_depth and self._connection is not None:
+            self._pending.append((self._board, _key_to_bytes(key), depth, value, flag))
+            if len(self._pending) >= FLUSH_SIZE:
+                self.flush()
+
+    def flush(self) -> None:
+        """Write the pending entries to the file and remove the shallowest
+        entries if it has more than max_entries."""
+        if not self._pending or self._connection is None:
+            return
+        with self._connection:
+            self._connection.executemany(
+                "INSERT INTO entries (board, key, depth, value, flag) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (board, key) DO UPDATE SET depth = excluded.depth, "
+                "value = excluded.value, flag = excluded.flag WHERE excluded.depth >= entries.depth",
+                self._pending)
+            self._pending = []
+            excess = self._connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._connection.execute(
+                    "DELETE FROM entries WHERE rowid IN "
+                    "(SELECT rowid FROM entries ORDER BY depth, rowid LIMIT ?)", (excess,))
+
+    def sync(self) -> None:
+        """Write the pending entries and load the ones added by other processes."""
+        if self._connection is None:
+            return
+        self.flush()
+        self._load("AND rowid > ?", (self._last_row,))
+
+    def clear(self) -> None:
+        """Remove all the entries in memory and reset the counters, the file is not changed."""
+        super().clear()
+        self._pending = []
+
+    def close(self) -> None:
+        """Write the pending entries and close the file."""
+        if self._connection is None:
+            return
+        self.flush()
+        self._connection.close()
+        self._connection = None
+        atexit.unregister(self.close)
+
+
+def count_entries(path: str) -> List[Tuple[str, int, int]]:
+    """Count the entries of a file for each board size.
+
+    Args:
+        path (str): The path of the file.
+
+    Returns:
+        List[Tuple[str, int, int]]: The size of the board, the entries and their maximum depth.
+    """
+    connection = connect(path)
+    try:
+        rows = connection.execute("SELECT board, COUNT(*), MAX(depth) FROM entries GROUP BY board")
+        return [(f"{board >> 16}x{board >> 8 & 255} k={board & 255}", count, depth)
+                for board, count, depth in rows]
+    finally:
+        connection.close()
+
+
+def warm_up(path: str, rows: int, columns: int, k: int, games: int, depth: Optional[int] = None,
+            max_entries: int = DEFAULT_MAX_ENTRIES, seed: int = 0) -> int:
+    """Fill the file with the positions of games of the AI against itself.
+
+    Each game starts with a random move of the human player, then both
+    players play the move of the AI, so the positions are the ones most
+    likely to be searched in real games.
+
+    Args:
+        path (str): The path of the file.
+        rows (int): The number of rows of the board.
+        columns (int): The number of columns of the board.
+        k (int): The number of marks in a row needed to win.
+        games (int): The number of games.
+        depth (int): The search horizon, the default of the AI if it's None.
+        max_entries (int): The maximum number of entries of the file.
+        seed (int): The seed of the first moves.
+
+    Returns:
+        int: The number of entries of the file for the board.
+    """
+    # Imported here because the AI imports this module
+    from ai import enable_persistent_cache, get_shared_table
+    from selfplay import MinimaxAgent
+
+    enable_persistent_cache(path, max_entries)
+    geometry = get_geometry(rows, columns, k)
+    table = get_shared_table(geometry)
+    agent = MinimaxAgent(depth)
+    rng = random.Random(seed)
+    try:
+        for _ in range(games):
+            board = Board(geometry=geometry)
+            board.make_move(rng.randrange(geometry.size), 1)
+            player = 0
+            while board.status() is None:
+                board.make_move(agent.choose(board, player), player)
+                player = 1 - player
+            table.flush()
+    finally:
+        table.close()
+    label = f"{rows}x{columns} k={k}"
+    return next((count for board, count, _ in count_entries(path) if board == label), 0)
+
+
+def main() -> None:
+    """Run the commands of the cache from the command line."""
+    parser = argparse.ArgumentParser(description="Persistent transposition table of the AI")
+    commands = parser.add_subparsers(dest="command", required=True)
+    warm = commands.add_parser("warm", help="fill the cache with games of the AI against itself")
+    warm.add_argument("--path", required=True, help="file of the cache")
+    warm.add_argument("--rows", type=int, default=4)
+    warm.add_argument("--columns", type=int, default=4)
+    warm.add_argument("--k", type=int, default=3)
+    warm.add_argument("--games", type=int, default=20)
+    warm.add_argument("--depth", type=int, default=None, help="search horizon of the AI")
+    warm.add_argument("--max-entries", type=int, default=DEFAULT_MAX_ENTRIES)
+    warm.add_argument("--seed", type=int, default=0)
+    stats = commands.add_parser("stats", help="show the entries of the cache")
+    stats.add_argument("--path", required=True, help="file of the cache")
+    arguments = parser.parse_args()
+
+    if arguments.command == "warm":
+        start = time.perf_counter()
+        entries = warm_up(arguments.path, arguments.rows, arguments.columns, arguments.k,
+                          arguments.games, arguments.depth, arguments.max_entries, arguments.seed)
+        print(f"{entries} entries for {arguments.rows}x{arguments.columns} k={arguments.k} "
+              f"in {time.perf_counter() - start:.2f}s")
+    else:
+        for board, count, depth in count_entries(arguments.path):
+            print(f"{board}: {count} entries, max depth {depth}")
+
+
+if __name__ == "__main__":
+    main()
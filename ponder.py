@@ -0,0 +1,166 @@
+"""
+Search of the computer during the turn of the human player.
+
+While the game waits for the move of the human player, a background thread
+searches the reply of the computer to each of the likely moves, the expected
+one first, and keeps the results. When the move arrives its result is used if
+it was already searched (a ponder hit). If the move is being searched the
+search is awaited, and otherwise (a ponder miss) the background search is
+cancelled and the AI searches the move as usual, with the positions already
+searched in the transposition table.
+
+The thread only runs while the game waits for the human player, so the
+transposition table is never used by two searches at the same time.
+"""
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from ai import AI, SearchStats, SearchTimeout
+from position import Board, Position
+
+
+class Ponderer:
+    """Search the replies of the computer to the moves of the human player in the background.
+
+    Attributes
+    ----------
+    ai : AI
+        The AI of the computer, the searches use its settings and its table.
+    hits : int
+        The moves of the human player whose reply was already searched.
+    misses : int
+        The moves of the human player whose reply wasn't searched.
+
+    Methods
+    -------
+    start(board: Board, expected: Optional[int]) -> None
+        Start searching the replies to the moves of the human player in a board.
+    take(board: Board) -> Optional[SearchStats]
+        Stop pondering and get the result of the board after the move of the human player.
+    stop() -> None
+        Cancel the background search and wait for it to finish.
+    """
+
+    def __init__(self, ai: AI) -> None:
+        """Initialize the pondering of an AI.
+
+        Args:
+            ai (AI): The AI of the computer.
+        """
+        self.ai = ai
+        self.hits = 0
+        self.misses = 0
+        self._results: Dict[Tuple[int, int], SearchStats] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        # Set to not start another search, the current one is finished
+        self._stopping = threading.Event()
+        # True if the current search was interrupted, its result is discarded
+        self._aborted = False
+        self._current: Optional[Tuple[int, int]] = None
+        self._worker: Optional[AI] = None
+
+    def start(self, board: Board, expected: Optional[int] = None) -> None:
+        """Start searching the replies to the moves of the human player in a board.
+
+        Nothing is searched if the moves of the AI are read from the solved table.
+
+        Args:
+            board (Board): The board with the human player to move, it's not changed.
+            expected (int): The move of the human player expected by the last search,
+                            its reply is searched first.
+        """
+        self.stop()
+        self._results = {}
+        if self.ai.solved is not None or board.status() is not None:
+            return
+        moves = self.ai.order_moves(board, 1)
+        if expected in moves:
+            moves.remove(expected)
+            moves.insert(0, expected)
+        self._stopping.clear()
+        self._aborted = False
+        self._thread = threading.Thread(target=self._run, args=(board.copy(), moves),
+                                        name="ponder", daemon=True)
+        self._thread.start()
+
+    def _run(self, board: Board, moves: List[int]) -> None:
+        """Search the reply to each move until all are searched or the pondering stops."""
+        for move in moves:
+            if self._stopping.is_set():
+                return
+            board.make_move(move, 1)
+            key = (board.o_bits, board.x_bits)
+            if board.status() is None:
+                worker = AI(Position.from_board(board.copy()), self.ai.table, use_solved_table=False,
+                            depth=self.ai.depth, time_limit=self.ai.time_limit,
+                            node_limit=self.ai.node_limit, move_ordering=self.ai.move_ordering,
+                            null_window=self.ai.null_window, use_mtdf=self.ai.use_mtdf)
+                with self._lock:
+                    self._current = key
+                    self._worker = worker
+                    # Interrupted before the worker was known
+                    if self._aborted:
+                        worker.stop_event.set()
+                try:
+                    stats: Optional[SearchStats] = worker._choose_move()
+                except SearchTimeout:
+                    stats = None
+                with self._lock:
+                    self._current = None
+                    self._worker = None
+                    # The iterative deepening returns the last iteration when it's interrupted
+                    if stats is not None and not self._aborted:
+                        stats.source = "ponder"
+                        self._results[key] = stats
+            board.undo_move(move, 1)
+
+    def _abort(self) -> None:
+        """Interrupt the current search, it raises SearchTimeout within a few nodes."""
+        with self._lock:
+            self._aborted = True
+            if self._worker is not None:
+                self._worker.stop_event.set()
+
+    def _join(self) -> None:
+        """Wait for the thread to finish."""
+        self._thread.join()
+        self._thread = None
+
+    def take(self, board: Board) -> Optional[SearchStats]:
+        """Stop pondering and get the result of the board after the move of the human player.
+
+        If the board is being searched the search is finished, otherwise the
+        background search is cancelled.
+
+        Args:
+            board (Board): The board with the computer to move.
+
+        Returns:
+            SearchStats: The statistics of the search of the board if it was searched.
+            None: If the board wasn't searched or there was no pondering.
+        """
+        if self._thread is None:
+            return None
+        key = (board.o_bits, board.x_bits)
+        self._stopping.set()
+        with self._lock:
+            searching = self._current == key
+        if not searching:
+            self._abort()
+        self._join()
+        stats = self._results.get(key)
+        self._results = {}
+        if stats is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return stats
+
+    def stop(self) -> None:
+        """Cancel the background search and wait for it to finish."""
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._abort()
+        self._join()
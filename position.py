@@ -1,13 +1,588 @@
 """Represent the state of a position in a TicTacToeGame"""
-from typing import List, Union
+from functools import lru_cache
+from typing import Callable, Iterator, List, Optional, Tuple, Union
+
+
+# Version of the evaluation, raised whenever the value of a board changes, for
+# example the win score or the heuristic. The values stored with another
+# version, like the entries of the persistent cache, are discarded
+EVALUATION_VERSION = 2
+
+class Geometry:
+    """Winning lines of a board of rows x columns squares with k marks in a row.
+    
+    The square of the row r and the column c is the bit r * columns + c.
+    
+    Attributes
+    ----------
+    rows : int
+        The number of rows.
+    columns : int
+        The number of columns.
+    k : int
+        The number of marks in a row needed to win.
+    size : int
+        The number of squares.
+    full_mask : int
+        The bits of all the squares.
+    row_lines : Tuple[int, ...]
+        The masks of the horizontal lines of k squares.
+    column_lines : Tuple[int, ...]
+        The masks of the vertical lines of k squares.
+    diagonal_lines : Tuple[int, ...]
+        The masks of the diagonal lines of k squares.
+    lines : Tuple[int, ...]
+        The masks of all the winning lines.
+    square_lines : Tuple[Tuple[int, ...], ...]
+        The masks of the lines that go through each square.
+    square_line_indexes : Tuple[Tuple[int, ...], ...]
+        The indexes in lines of the lines that go through each square.
+    line_scores : Tuple[Tuple[int, ...], ...]
+        The heuristic evaluation of a line by the marks of the computer and 
+        the marks of the human player in it.
+    win_score : int
+        The evaluation of a win, greater than any heuristic evaluation.
+    """
+    
+    __slots__ = ("rows", "columns", "k", "size", "full_mask", "row_lines", "column_lines",
+                 "diagonal_lines", "lines", "square_lines", "square_line_indexes", "line_scores",
+                 "win_score")
+    
+    def __init__(self, rows: int, columns: int, k: int) -> None:
+        """Precompute the lines of the board.
+
+        Args:
+            rows (int): The number of rows.
+            columns (int): The number of columns.
+            k (int): The number of marks in a row needed to win.
+            
+        Raises:
+            ValueError: if k doesn't fit in the board.
+        """
+        if rows < 1 or columns < 1 or k < 1 or k > max(rows, columns):
+            raise ValueError(f"Invalid board {rows}x{columns} with {k} in a row")
+        self.rows = rows
+        self.columns = columns
+        self.k = k
+        self.size = rows * columns
+        self.full_mask = (1 << self.size) - 1
+        self.row_lines = self._build_lines(0, 1)
+        self.column_lines = self._build_lines(1, 0)
+        self.diagonal_lines = self._build_lines(1, 1) + self._build_lines(1, -1)
+        self.lines = self.row_lines + self.column_lines + self.diagonal_lines
+        self.square_lines = tuple(
+            tuple(mask for mask in self.lines if mask >> square & 1) 
+            for square in range(self.size))
+        self.square_line_indexes = tuple(
+            tuple(line for line, mask in enumerate(self.lines) if mask >> square & 1)
+            for square in range(self.size))
+        self.line_scores = tuple(
+            tuple(self.line_score(o_count, x_count) for x_count in range(k + 1))
+            for o_count in range(k + 1))
+        
+        # The heuristic evaluation of a line is at most 10^(k-2) before a win
+        heuristic_bound = len(self.lines) * 10 ** max(k - 2, 0)
+        self.win_score = 100
+        while self.win_score <= heuristic_bound:
+            self.win_score *= 10
+        
+    def _build_lines(self, row_step: int, column_step: int) -> Tuple[int, ...]:
+        """Get the masks of the lines of k squares in a direction.
+
+        Args:
+            row_step (int): The rows advanced in each square of the line.
+            column_step (int): The columns advanced in each square of the line.
+
+        Returns:
+            Tuple[int, ...]: The masks of the lines.
+        """
+        lines = []
+        for row in range(self.rows):
+            for column in range(self.columns):
+                end_row = row + row_step * (self.k - 1)
+                end_column = column + column_step * (self.k - 1)
+                if not (0 <= end_row < self.rows and 0 <= end_column < self.columns):
+                    continue
+                mask = 0
+                for i in range(self.k):
+                    mask |= 1 << ((row + row_step * i) * self.columns + column + column_step * i)
+                lines.append(mask)
+        return tuple(lines)
+    
+    def line_score(self, o_count: int, x_count: int) -> int:
+        """Get the heuristic evaluation of a line.
+
+        A line is only valuable for a player if the other player has no mark in it.
+
+        Args:
+            o_count (int): The marks of the computer (O) in the line.
+            x_count (int): The marks of the human player (X) in the line.
+
+        Returns:
+            int: 10^(marks - 1) for the computer, the negative for the human player 
+                 and 0 if both or none have marks in the line.
+        """
+        if x_count == 0 and o_count > 0:
+            return 10 ** (o_count - 1)
+        if o_count == 0 and x_count > 0:
+            return -10 ** (x_count - 1)
+        return 0
+    
+    def __repr__(self) -> str:
+        return f"Geometry({self.rows}, {self.columns}, {self.k})"
+    
+
+@lru_cache(maxsize=None)
+def get_geometry(rows: int = 3, columns: int = 3, k: int = 3) -> Geometry:
+    """Get the geometry of a board, it's computed once for each size.
+
+    Args:
+        rows (int): The number of rows.
+        columns (int): The number of columns.
+        k (int): The number of marks in a row needed to win.
+
+    Returns:
+        Geometry: The lines of the board.
+    """
+    return Geometry(rows, columns, k)
+
+
+# The 3x3 board with 3 in a row
+CLASSIC = get_geometry(3, 3, 3)
+
+
+class Board:
+    """Bitboard of a TicTacToe position.
+    
+    Each player is stored as an integer where the bit i is set if the 
+    player has a mark in the square i of the board. The marks of each player 
+    in each line are counted, so a move only updates the lines that go through 
+    its square to know the winner and the heuristic evaluation. The moves can
+    be made and undone in place with make_move and undo_move.
+    
+    Attributes
+    ----------
+    o_bits : int
+        The squares occupied by the computer (player 0, O).
+    x_bits : int
+        The squares occupied by the human player (player 1, X).
+    geometry : Geometry
+        The lines of the board.
+    score : int
+        The heuristic evaluation of the lines of the board.
+    line_counts : Tuple[List[int], List[int]]
+        The marks of the computer and the human player in each line.
+    complete_lines : List[int]
+        The lines filled by the computer and by the human player.
+    """
+    
+    __slots__ = ("o_bits", "x_bits", "geometry", "score", "line_counts", "complete_lines",
+                 "_outcome")
+    
+    def __init__(self, o_bits: int = 0, x_bits: int = 0, geometry: Geometry = CLASSIC,
+                 score: Optional[int] = None) -> None:
+        """Initialize a new board.
+
+        Args:
+            o_bits (int): The squares occupied by the computer (O).
+            x_bits (int): The squares occupied by the human player (X).
+            geometry (Geometry): The lines of the board.
+            score (int): The heuristic evaluation if it's already known.
+        """
+        self.o_bits = o_bits
+        self.x_bits = x_bits
+        self.geometry = geometry
+        o_counts = [(o_bits & mask).bit_count() for mask in geometry.lines]
+        x_counts = [(x_bits & mask).bit_count() for mask in geometry.lines]
+        self.line_counts = (o_counts, x_counts)
+        self.complete_lines = [o_counts.count(geometry.k), x_counts.count(geometry.k)]
+        if score is None:
+            line_scores = geometry.line_scores
+            score = sum(line_scores[o_count][x_count] for o_count, x_count in zip(o_counts, x_counts))
+        self.score = score
+        # Status and evaluation of the current marks, computed on the first read
+        self._outcome = None
+        
+    @classmethod
+    def from_list(cls, pos_list: list, geometry: Optional[Geometry] = None) -> "Board":
+        """Create a board from a list of None, 0 and 1 values.
+
+        Args:
+            pos_list (list): The position as a list.
+            geometry (Geometry): The lines of the board, the classic board by default.
+
+        Returns:
+            Board: The board with the same marks of the list.
+            
+        Raises:
+            ValueError: if the length of the list doesn't match the board.
+        """
+        if geometry is None:
+            geometry = CLASSIC
+        if len(pos_list) != geometry.size:
+            raise ValueError(f"The position must have {geometry.size} squares, not {len(pos_list)}")
+        o_bits = 0
+        x_bits = 0
+        for i, value in enumerate(pos_list):
+            if value == 0:
+                o_bits |= 1 << i
+            elif value == 1:
+                x_bits |= 1 << i
+        return cls(o_bits, x_bits, geometry)
+    
+    def to_list(self) -> list:
+        """Get the board as a list of None, 0 and 1 values.
+
+        Returns:
+            list: The position as a list.
+        """
+        return [self.get(i) for i in range(self.geometry.size)]
+    
+    def get(self, index: int) -> Optional[int]:
+        """Get the mark in a square.
+
+        Args:
+            index (int): The index of the square.
+
+        Returns:
+            int: 0 for the computer (O) or 1 for the human player (X).
+            None: If the square is empty.
+        """
+        bit = 1 << index
+        if self.o_bits & bit:
+            return 0
+        if self.x_bits & bit:
+            return 1
+        return None
+    
+    def set(self, index: int, value: Optional[int]) -> None:
+        """Set the mark in a square, replacing the previous one.
+
+        Args:
+            index (int): The index of the square.
+            value (int): 0 for the computer (O), 1 for the human player (X) 
+                         or None to empty the square.
+        """
+        if self.get(index) == value:
+            return
+        current = self.get(index)
+        if current is not None:
+            self.undo_move(index, current)
+        if value is not None:
+            self.make_move(index, value)
+            
+    def make_move(self, index: int, player: int) -> bool:
+        """Place a mark of the player in an empty square.
+
+        Only the lines that go through the square change their counters,
+        the winner and the heuristic evaluation.
+
+        Args:
+            index (int): The index of the square.
+            player (int): 0 for the computer (O), 1 for the human player (X).
+
+        Returns:
+            bool: True if the mark completes a line of the player, False otherwise.
+        """
+        geometry = self.geometry
+        # The counters aren't checked by the search, a taken square corrupts them
+        assert 0 <= index < geometry.size and not (self.o_bits | self.x_bits) >> index & 1, \
+            f"The square {index} is not empty"
+        line_scores = geometry.line_scores
+        k = geometry.k
+        o_counts, x_counts = self.line_counts
+        delta = 0
+        self._outcome = None
+        won = False
+        if player == 0:
+            self.o_bits |= 1 << index
+            for line in geometry.square_line_indexes[index]:
+                o_count = o_counts[line]
+                x_count = x_counts[line]
+                delta += line_scores[o_count + 1][x_count] - line_scores[o_count][x_count]
+                o_counts[line] = o_count + 1
+                if o_count + 1 == k:
+                    self.complete_lines[0] += 1
+                    won = True
+        else:
+            self.x_bits |= 1 << index
+            for line in geometry.square_line_indexes[index]:
+                o_count = o_counts[line]
+                x_count = x_counts[line]
+                delta += line_scores[o_count][x_count + 1] - line_scores[o_count][x_count]
+                x_counts[line] = x_count + 1
+                if x_count + 1 == k:
+                    self.complete_lines[1] += 1
+                    won = True
+        self.score += delta
+        return won
+        
+    def undo_move(self, index: int, player: int) -> None:
+        """Remove the mark of the player placed in a square with make_move.
+
+        Args:
+            index (int): The index of the square.
+            player (int): 0 for the computer (O), 1 for the human player (X).
+        """
+        geometry = self.geometry
+        line_scores = geometry.line_scores
+        k = geometry.k
+        o_counts, x_counts = self.line_counts
+        delta = 0
+        self._outcome = None
+        if player == 0:
+            self.o_bits &= ~(1 << index)
+            for line in geometry.square_line_indexes[index]:
+                o_count = o_counts[line]
+                x_count = x_counts[line]
+                delta += line_scores[o_count - 1][x_count] - line_scores[o_count][x_count]
+                o_counts[line] = o_count - 1
+                if o_count == k:
+                    self.complete_lines[0] -= 1
+        else:
+            self.x_bits &= ~(1 << index)
+            for line in geometry.square_line_indexes[index]:
+                o_count = o_counts[line]
+                x_count = x_counts[line]
+                delta += line_scores[o_count][x_count - 1] - line_scores[o_count][x_count]
+                x_counts[line] = x_count - 1
+                if x_count == k:
+                    self.complete_lines[1] -= 1
+        self.score += delta
+    
+    def copy(self) -> "Board":
+        """Create a copy of the board."""
+        board = Board.__new__(Board)
+        board.o_bits = self.o_bits
+        board.x_bits = self.x_bits
+        board.geometry = self.geometry
+        board.score = self.score
+        board.line_counts = (self.line_counts[0].copy(), self.line_counts[1].copy())
+        board.complete_lines = self.complete_lines.copy()
+        board._outcome = self._outcome
+        return board
+    
+    def player_bits(self, player: int) -> int:
+        """Get the squares occupied by a player.
+
+        Args:
+            player (int): 0 for the computer (O), 1 for the human player (X).
+
+        Returns:
+            int: The bits of the squares occupied by the player.
+        """
+        return self.o_bits if player == 0 else self.x_bits
+    
+    def empty_bits(self) -> int:
+        """Get the bits of the empty squares."""
+        return self.geometry.full_mask & ~(self.o_bits | self.x_bits)
+    
+    def possible_moves(self) -> List[int]:
+        """Get the indexes of the empty squares in ascending order."""
+        moves = []
+        empty = self.empty_bits()
+        while empty:
+            lowest = empty & -empty
+            moves.append(lowest.bit_length() - 1)
+            empty ^= lowest
+        return moves
+    
+    def move_priority(self, player: int) -> Callable[[int], Tuple[bool, bool, int]]:
+        """Get the key that sorts the moves of a player by the board alone.
+
+        The moves that win are the greatest, then the moves that block a win of
+        the opponent and then the squares with more lines (center, then corners).
+        The search adds its own heuristics on top of this key.
+
+        Args:
+            player (int): The player to move, 0 for the computer (O), 1 for the human player (X).
+
+        Returns:
+            Callable[[int], Tuple[bool, bool, int]]: The key of a move, valid until
+                                                     the board changes.
+        """
+        geometry = self.geometry
+        square_lines = geometry.square_lines
+        needed = geometry.k - 1
+        own_bits = self.player_bits(player)
+        opponent_bits = self.player_bits(1 - player)
+
+        def priority(move: int) -> Tuple[bool, bool, int]:
+            wins = blocks = False
+            lines = square_lines[move]
+            for mask in lines:
+                own = (own_bits & mask).bit_count()
+                opponent = (opponent_bits & mask).bit_count()
+                if own == needed and opponent == 0:
+                    wins = True
+                elif opponent == needed and own == 0:
+                    blocks = True
+            return (wins, blocks, len(lines))
+
+        return priority
+    
+    def empty_count(self) -> int:
+        """Get the number of empty squares."""
+        return self.geometry.size - (self.o_bits | self.x_bits).bit_count()
+    
+    def has_won(self, player: int) -> bool:
+        """Check if the player has a complete line.
+
+        Args:
+            player (int): 0 for the computer (O), 1 for the human player (X).
+
+        Returns:
+            bool: True if the player has won, False otherwise.
+        """
+        return self.complete_lines[player] > 0
+    
+    def line_winner(self, mask: int) -> Optional[int]:
+        """Get the player that fills all the squares of a line.
+
+        Args:
+            mask (int): The bits of the line.
+
+        Returns:
+            int: 0 for the computer (O) or 1 for the human player (X).
+            None: If no player fills the line.
+        """
+        if self.o_bits & mask == mask:
+            return 0
+        if self.x_bits & mask == mask:
+            return 1
+        return None
+    
+    def outcome(self) -> Tuple[Union[str, int, None], int]:
+        """Get the status and the evaluation of the board.
+
+        Both are computed together from the line counters the first time
+        they are read and kept until the next move or undo.
+
+        Returns:
+            Tuple[Union[str, int, None], int]: The status as returned by status()
+                                               and the value of evaluation().
+        """
+        outcome = self._outcome
+        if outcome is None:
+            if self.complete_lines[0]:
+                outcome = (0, self.geometry.win_score + self.empty_count())
+            elif self.complete_lines[1]:
+                outcome = (1, -(self.geometry.win_score + self.empty_count()))
+            elif self.o_bits | self.x_bits == self.geometry.full_mask:
+                outcome = ("tie", 0)
+            else:
+                outcome = (None, self.score)
+            self._outcome = outcome
+        return outcome
+    
+    def status(self) -> Union[str, int, None]:
+        """Get the status of the game.
+
+        Returns:
+            int: Returns 1 if the player wins (X).
+            int: Returns 0 if the computer wins (O).
+            str: Returns 'tie' if it's a tie.
+            None: Returns None if the game is unfinished.
+        """
+        return self.outcome()[0]
+    
+    def evaluation(self) -> int:
+        """Get the evaluation value of the board.
+
+        Returns:
+            int: The win score plus the empty squares if the computer has won,
+                 the negative of the same if the human player has won, 0 if it's
+                 a tie and the heuristic evaluation if the game is unfinished.
+                 The empty squares make the faster wins and the slower losses
+                 better for both players.
+        """
+        return self.outcome()[1]
+    
+
+class PositionListView:
+    """Mutable list view over the squares of a board.
+    
+    Keep compatibility with the code that reads and writes the position 
+    as a list of None, 0 and 1 values, every change is written in the board.
+    
+    Attributes
+    ----------
+    board : Board
+        The board of the view.
+    """
+    
+    __slots__ = ("board",)
+    
+    def __init__(self, board: Board) -> None:
+        """Initialize the view over a board.
+
+        Args:
+            board (Board): The board of the view.
+        """
+        self.board = board
+        
+    def __len__(self) -> int:
+        return self.board.geometry.size
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.board.to_list()[index]
+        size = self.board.geometry.size
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("position index out of range")
+        return self.board.get(index)
+    
+    def __setitem__(self, index: int, value: Optional[int]) -> None:
+        size = self.board.geometry.size
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("position assignment index out of range")
+        self.board.set(index, value)
+        
+    def __iter__(self) -> Iterator[Optional[int]]:
+        return iter(self.board.to_list())
+    
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (list, PositionListView)):
+            return self.board.to_list() == list(other)
+        return NotImplemented
+    
+    def count(self, value: Optional[int]) -> int:
+        """Count the squares that have the value.
+
+        Args:
+            value (int): None, 0 or 1.
+
+        Returns:
+            int: The number of squares with the value.
+        """
+        if value is None:
+            return self.board.empty_count()
+        return self.board.player_bits(value).bit_count()
+    
+    def copy(self) -> list:
+        """Get a copy of the position as a list."""
+        return self.board.to_list()
+    
+    def __repr__(self) -> str:
+        return repr(self.board.to_list())
 
 
 class Position:
     """Represent the state of a position in a TicTacToeGame
     
+    The marks are stored in a Board and the list of the position is a view
+    over it, so reading or writing the list changes the board. The board can 
+    have any number of rows and columns, by default it's the classic 3x3 board.
+    
     Attributes
     ----------
-    pos_list : list
+    board : Board
+        The bitboard of the position.
+    pos_list : PositionListView
         The current position of the TicTacToe game.
     pos_length : int
         The length of the position list.
@@ -22,8 +597,14 @@ class Position:
         
     Methods
     -------
+    from_board(board: Board) -> Position
+        Create a position from a board.
     check_win(player: int) -> bool
         Check if the specified player has won the game.
+    make_move(index: int, player: int) -> bool
+        Place a mark of the player in an empty square in place.
+    undo_move(index: int, player: int) -> None
+        Remove the mark placed with make_move.
     create_children(p_moves_index: list, ai_turn: bool) -> None
         Create the children of the position.
     get_possible_moves() -> list
@@ -54,7 +635,7 @@ class Position:
         Print the current state of the position.
     """
     
-    def __init__(self, pos_list: list) -> None:
+    def __init__(self, pos_list: list, geometry: Optional[Geometry] = None) -> None:
         """Intialize a new position
 
         Copy the current position of the game and create an empty list of children
@@ -62,23 +643,60 @@ class Position:
         
         Args:
             pos_list (list): The current position of the TicTacToe game.
+            geometry (Geometry): The lines of the board, the classic 3x3 board by default.
             pos_length (int): The length of the position list.
             evaluation (int): The evaluation value of the position.
             children (List["Position"]): The list of the children of the position.
             game_over (bool): True if the game is finished, False otherwise.
             winner_player (int): The winner of the game.
         """
-        self.pos_list = pos_list
-        self.pos_length = len(self.pos_list)
+        self._setup(Board.from_list(pos_list, geometry))
+        
+    @classmethod
+    def from_board(cls, board: Board) -> "Position":
+        """Create a position from a board without converting it to a list.
+
+        Args:
+            board (Board): The board of the position, it's not copied.
+
+        Returns:
+            Position: The new position.
+        """
+        position = cls.__new__(cls)
+        position._setup(board)
+        return position
+        
+    def _setup(self, board: Board) -> None:
+        """Set the initial attributes of the position.
+
+        Args:
+            board (Board): The board of the position.
+        """
+        self.board = board
+        self.pos_length = board.geometry.size
         self.evaluation = 0
         self.children: List["Position"] = []
         self.game_over = False
         self.winner_player = None
+        
+    @property
+    def pos_list(self) -> PositionListView:
+        """Get the position as a list view over the board."""
+        return PositionListView(self.board)
+    
+    @pos_list.setter
+    def pos_list(self, pos_list: list) -> None:
+        """Replace the marks of the position.
+
+        Args:
+            pos_list (list): The new position as a list.
+        """
+        self.board = Board.from_list(pos_list, self.board.geometry)
 
     @property
     def game_over(self) -> bool:
         """Check if the game is finished or not."""
-        result = self.check_game_status()
+        result = self.board.status()
         if result is not None:
             self._game_over = True
             self.winner_player = result
@@ -99,7 +717,13 @@ class Position:
 
         If the computer (player 0) has won, it adds 100 to the evaluation score, 
         plus the empty postions remaining. 
-        If the human player (player 1) has won, it subtracts 100 from the evaluation score. 
+        If the human player (player 1) has won, it subtracts 100 from the evaluation score,
+        minus the empty positions remaining. 
+        On boards bigger than 3x3 the win score grows to stay above any heuristic value.
+        
+        If the game is unfinished the heuristic evaluation is used: each line without
+        marks of the human player adds 10^(marks - 1) and each line without marks of 
+        the computer subtracts 10^(marks - 1).
 
         The minimax algorithm uses this evaluation function to choose the move 
         that maximizes the potential score for the computer and minimizes the potential score 
@@ -108,13 +732,7 @@ class Position:
         Returns:
             int: The evaluation value of the position.
         """
-        eval_score = 0
-        if self.check_win(0):
-            eval_score += 100 + self.get_empty_positions()
-        elif self.check_win(1):
-            eval_score -= 100
-
-        return eval_score
+        return self.board.evaluation()
     
     @evaluation.setter
     def evaluation(self, value: int) -> None:
@@ -134,23 +752,38 @@ class Position:
         Returns:
             bool: True if the player has won, False otherwise.
         """
-        # Check rows
-        for i in range(0, self.pos_length, 3):
-            if self.pos_list[i] == player and self.pos_list[i] == self.pos_list[i+1] == self.pos_list[i+2]:
-                return True
+        return self.board.has_won(player)
+    
+    def make_move(self, index: int, player: int) -> bool:
+        """Place a mark of the player in an empty square in place.
 
-        # Check columns
-        for i in range(3):
-            if self.pos_list[i] == player and self.pos_list[i] == self.pos_list[i+3] == self.pos_list[i+6]:
-                return True
+        The win status is updated with the lines of the square, so a search 
+        can make and undo moves on one position without copying it.
 
-        # Check diagonals
-        if self.pos_list[0] == player and self.pos_list[0] == self.pos_list[4] == self.pos_list[8]:
-            return True
-        if self.pos_list[2] == player and self.pos_list[2] == self.pos_list[4] == self.pos_list[6]:
-            return True
+        Args:
+            index (int): The index of the square.
+            player (int): 0 for the computer (O), 1 for the human player (X).
+
+        Returns:
+            bool: True if the mark wins the game, False otherwise.
 
-        return False
+        Raises:
+            ValueError: if the index is out of the board or the square is not empty.
+        """
+        board = self.board
+        if not 0 <= index < board.geometry.size or (board.o_bits | board.x_bits) >> index & 1:
+            raise ValueError(f"The square {index} is not an empty square of the board")
+        return board.make_move(index, player)
+        
+    def undo_move(self, index: int, player: int) -> None:
+        """Remove the mark placed with make_move.
+
+        Args:
+            index (int): The index of the square.
+            player (int): 0 for the computer (O), 1 for the human player (X).
+        """
+        self.board.undo_move(index, player)
+        self.game_over = False
     
     @property
     def children_length(self) -> int:
@@ -164,38 +797,25 @@ class Position:
     def reset_position(self) -> None:
         """Reset the values of the list and set the game 
         unfinished to start another."""
-        for i in range(self.pos_length):
-            self.pos_list[i] = None
+        self.board = Board(geometry=self.board.geometry)
         self.game_over = False
 
     def create_children(self, p_moves_index: list, ai_turn: bool) -> None:
         """Create the children of the position.
         
         Make all the available moves and create a child for each move,
-        with the player that moves next turn.
+        with the player that moves next turn. The children are kept in 
+        the children list.
         
         Args:
-            p_moves_index (list): All the possible moves.
+            p_moves_index (list): All the possible moves, the list is not changed.
             ai_turn (bool): True if it's the AI turn, False otherwise.
         """
-        # For each possible move, create a child
-        while len(p_moves_index) > 0:
-            pos_copy = self.pos_list.copy( )
-            
-            if ai_turn:
-                # Perform the first available move with 0 (computer turn)
-                pos_copy[p_moves_index[0]] = 0
-                child = Position(pos_copy)
-            else:
-                # Perfrom the first available move with 1 (player turn)
-                pos_copy[p_moves_index[0]] = 1
-                child = Position(pos_copy)
-                
-            # Add the new child to the list of children
-            self.children.append(child)
-            
-            # Remove the move that has been performed
-            p_moves_index.pop(0)
+        player = 0 if ai_turn else 1
+        for move in p_moves_index:
+            board_copy = self.board.copy()
+            board_copy.make_move(move, player)
+            self.children.append(Position.from_board(board_copy))
 
     def get_possible_moves(self) -> list:
         """Get the list of the possible moves.
@@ -203,11 +823,7 @@ class Position:
         Returns:
             list: List that have all the possible moves.
         """
-        possible_moves = []
-        for i in range(self.pos_length):
-            if self.pos_list[i] == None:
-                possible_moves.append(i)
-        return possible_moves
+        return self.board.possible_moves()
         
     def get_empty_positions(self) -> int:
         """Get the number of empty positions in the list.
@@ -215,11 +831,11 @@ class Position:
         Returns:
             int: The number of empty positions.
         """
-        return self.pos_list.count(None)
+        return self.board.empty_count()
        
     def copy(self):
         """Create a copy of the current position."""
-        return Position(self.pos_list.copy())
+        return Position.from_board(self.board.copy())
 
     def check_game_status(self) -> Union[str, int, None]:
         """Check the status of the game.
@@ -233,84 +849,59 @@ class Position:
             str: Returns 'tie' if it's a tie.
             None: Returns None if the game is unfinished.
         """
-        # Verify the rows
-        result = self.check_rows()
-        if result is not None:
-            return result
-        
-        # Verify the columns
-        result = self.check_columns()
-        if result is not None:
-            return result
-            
-        # Verify the diagonals
-        # Top-left to bottom-right
-        result = self.check_diagonal(0, 4)  
-        if result is not None:
-            return result
-        # Top-right to bottom-left
-        result = self.check_diagonal(2, 2)  
-        if result is not None:
-            return result
-        
-        # Verify tie
-        result = self.check_tie()
-        if result is not None:
-            return result
-                
-        # If the game it's not finished return None
-        return None
+        return self.board.status()
 
     def check_rows(self) -> Union[int, None]:
         """Check the rows for a win.
 
+        A row wins with k marks in a row, the whole row in the classic board.
+
         Returns:
             int: Returns 1 if the player wins (X).
             int: Returns 0 if the computer wins (O).
             None: Returns None if no win is found.
         """
-        char_row = 0
-        temp = None
-        
-        for i in range(self.pos_length): 
-            
-            # Verify the rows
-            # If the current character is the same as the previous and is not none
-            if self.pos_list[i] == temp and self.pos_list[i] is not None:
-                char_row += 1
-            
-            # Save the previous character
-            temp = self.pos_list[i]
-            
-            # If are three characters in a row
-            if char_row == 2:
-                return self.pos_list[i]
-            
-            # Reset in the last character of the row
-            if i == 2 or i == 5:
-                char_row = 0
-                temp = None
-                
-        return None
+        return self._line_counts_winner(0, len(self.board.geometry.row_lines))
     
     def check_columns(self) -> Union[int, None]:
         """Check the columns for a win.
 
+        A column wins with k marks in a row, the whole column in the classic board.
+
         Returns:
             int: Returns 1 if the player wins (X).
             int: Returns 0 if the computer wins (O).
             None: Returns None if no win is found.
         """
-        for i in range(3):
-            if self.pos_list[i] is not None:
-                # If a column contains the same character
-                if self.pos_list[i] == self.pos_list[i + 3] == self.pos_list[i + 6]:
-                    return self.pos_list[i]
+        geometry = self.board.geometry
+        start = len(geometry.row_lines)
+        return self._line_counts_winner(start, start + len(geometry.column_lines))
+
+    def _line_counts_winner(self, start: int, end: int) -> Union[int, None]:
+        """Get the player that fills one of a range of lines, read from the line counters.
+
+        Args:
+            start (int): The index of the first line.
+            end (int): The index after the last line.
+
+        Returns:
+            int: 0 for the computer (O) or 1 for the human player (X).
+            None: If no player fills any of the lines.
+        """
+        k = self.board.geometry.k
+        o_counts, x_counts = self.board.line_counts
+        for line in range(start, end):
+            if o_counts[line] == k:
+                return 0
+            if x_counts[line] == k:
+                return 1
         return None
 
     def check_diagonal(self, index_start: int, step: int) -> Union[int, None]:
         """Check if all elements in a diagonal are the same and not None.
 
+        The diagonal has k elements, 3 in the classic board.
+
         Args:
             index_start (int): The start index in the list.
             step (int): The step to add to the index.
@@ -321,11 +912,10 @@ class Position:
             None: If the elements in the diagonal are not all the same 
                   or a element is None.
         """
-        if (self.pos_list[index_start] 
-            == self.pos_list[index_start + step]
-            == self.pos_list[index_start + step * 2] is not None):
-            return self.pos_list[index_start]
-        return None
+        mask = 0
+        for i in range(self.board.geometry.k):
+            mask |= 1 << (index_start + step * i)
+        return self.board.line_winner(mask)
     
     def check_tie(self) -> Union[str, None]:
         """Check for a tie
@@ -335,7 +925,7 @@ class Position:
                  no winner found.
            None: if there still are available movements.
         """
-        if all(character is not None for character in self.pos_list):
+        if self.board.empty_bits() == 0:
             return "tie"
         return None
     
@@ -352,21 +942,23 @@ class Position:
         
         None values are printed as spaces, 1 as X and 0 as O.
         """
+        columns = self.board.geometry.columns
+        pos_list = self.board.to_list()
         print()
         for i in range(0, self.pos_length):
-            if i % 3 == 2:
-                if self.pos_list[i] == 1:
+            if i % columns == columns - 1:
+                if pos_list[i] == 1:
                     print('X')
-                elif self.pos_list[i] == 0:
+                elif pos_list[i] == 0:
                     print('O')
                 else:
                     print(' ')
-                if i != len(self.pos_list) - 1:
-                    print('---------')
+                if i != len(pos_list) - 1:
+                    print('-' * (4 * columns - 3))
             else:
-                if self.pos_list[i] == 1:
+                if pos_list[i] == 1:
                     print('X', end=' | ')
-                elif self.pos_list[i] == 0:
+                elif pos_list[i] == 0:
                     print('O', end=' | ')
                 else:
                     print(' ', end=' | ')
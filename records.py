@@ -0,0 +1,314 @@
+"""
+Compact binary records of finished TicTacToe games.
+
+A file starts with a header with the size of the board, followed by one record
+of fixed size per game: the player that moved first, the outcome, the number of
+moves, the microseconds spent in the game and one byte per move, padded up to
+the number of squares. A game of the classic board takes 16 bytes.
+
+The records can be written and read as a stream without keeping them in memory,
+and a file can be memory-mapped to read any game by its index. Print the games
+of a file with:
+
+    python records.py games.ttt
+"""
+import mmap
+import struct
+import sys
+from typing import BinaryIO, Iterator, List
+
+from position import Board, Geometry, get_geometry
+
+
+MAGIC = b"TTTGAME1"
+# Magic, rows, columns and marks in a row needed to win
+HEADER = struct.Struct("<8sBBB")
+# First player, outcome, number of moves and microseconds spent in the game
+RECORD_PREFIX = struct.Struct("<BBBI")
+PADDING = 0xFF
+MAX_MICROSECONDS = 2 ** 32 - 1
+
+# Outcome of a game
+COMPUTER_WINS = 0
+PLAYER_WINS = 1
+TIE = 2
+
+# Records read from the file at a time by the stream reader
+READ_BATCH = 4096
+
+
+class GameRecord:
+    """Record of a finished game.
+
+    Attributes
+    ----------
+    first_player : int
+        The player that moved first, 0 for O and 1 for X.
+    moves : List[int]
+        The squares played in order.
+    outcome : int
+        COMPUTER_WINS (O), PLAYER_WINS (X) or TIE.
+    elapsed : float
+        The seconds spent in the game.
+
+    Methods
+    -------
+    replay(geometry: Geometry) -> Board
+        Get the final board of the game.
+    """
+
+    __slots__ = ("first_player", "moves", "outcome", "elapsed")
+
+    def __init__(self, first_player: int, moves: List[int], outcome: int, elapsed: float = 0.0) -> None:
+        """Initialize the record of a game.
+
+        Args:
+            first_player (int): The player that moved first.
+            moves (List[int]): The squares played in order.
+            outcome (int): COMPUTER_WINS, PLAYER_WINS or TIE.
+            elapsed (float): The seconds spent in the game.
+        """
+        self.first_player = first_player
+        self.moves = moves
+        self.outcome = outcome
+        self.elapsed = elapsed
+
+    def replay(self, geometry: Geometry) -> Board:
+        """Get the final board of the game.
+
+        Args:
+            geometry (Geometry): The lines of the board.
+
+        Returns:
+            Board: The board after all the moves.
+        """
+        board = Board(geometry=geometry)
+        player = self.first_player
+        for move in self.moves:
+            board.make_move(move, player)
+            player = 1 - player
+        return board
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, GameRecord):
+            return NotImplemented
+        return (self.first_player == other.first_player and self.moves == other.moves
+                and self.outcome == other.outcome)
+
+    def __repr__(self) -> str:
+        return (f"GameRecord(first_player={self.first_player}, moves={self.moves}, "
+                f"outcome={self.outcome}, elapsed={self.elapsed})")
+
+
+def record_size(geometry: Geometry) -> int:
+    """Get the bytes of each record of a board.
+
+    Args:
+        geometry (Geometry): The lines of the board.
+
+    Returns:
+        int: The size of a record.
+    """
+    return RECORD_PREFIX.size + geometry.size
+
+
+def _check_geometry(geometry: Geometry) -> None:
+    """Check that the moves of a board fit in one byte.
+
+    Raises:
+        ValueError: if the board has more than 255 squares.
+    """
+    if geometry.size >= PADDING:
+        raise ValueError(f"The records support boards of up to {PADDING - 1} squares, not {geometry.size}")
+
+
+def _read_header(file: BinaryIO, path: str) -> Geometry:
+    """Read the header of a file of records.
+
+    Raises:
+        ValueError: if the file is not a file of records.
+    """
+    data = file.read(HEADER.size)
+    if len(data) != HEADER.size:
+        raise ValueError(f"Invalid header of the game records: {path}")
+    magic, rows, columns, k = HEADER.unpack(data)
+    if magic != MAGIC:
+        raise ValueError(f"Invalid header of the game records: {path}")
+    return get_geometry(rows, columns, k)
+
+
+def _unpack(data, offset: int) -> GameRecord:
+    """Unpack the record that starts at an offset of a buffer."""
+    first_player, outcome, count, microseconds = RECORD_PREFIX.unpack_from(data, offset)
+    start = offset + RECORD_PREFIX.size
+    return GameRecord(first_player, list(data[start:start + count]), outcome, microseconds / 1e6)
+
+
+class RecordWriter:
+    """Write game records to a file as a stream.
+
+    Attributes
+    ----------
+    path : str
+        The path of the file.
+    geometry : Geometry
+        The lines of the board of the games.
+    count : int
+        The records written.
+
+    Methods
+    -------
+    write(record: GameRecord) -> None
+        Append a record to the file.
+    close() -> None
+        Flush and close the file.
+    """
+
+    def __init__(self, path: str, geometry: Geometry, append: bool = False) -> None:
+        """Open the file and write the header.
+
+        Args:
+            path (str): The path of the file.
+            geometry (Geometry): The lines of the board of the games.
+            append (bool): Add the records to the end of an existing file of the same board.
+
+        Raises:
+            ValueError: if the board is too big or the file to append has another board.
+        """
+        _check_geometry(geometry)
+        self.path = path
+        self.geometry = geometry
+        self.count = 0
+        self._buffer = bytearray(record_size(geometry))
+        if append:
+            try:
+                with open(path, "rb") as file:
+                    header = _read_header(file, path)
+                    if (header.rows, header.columns, header.k) != (geometry.rows, geometry.columns, geometry.k):
+                        raise ValueError(f"The game records have another board: {path}")
+            except FileNotFoundError:
+                append = False
+        self._file = open(path, "ab" if append else "wb")
+        if not append:
+            self._file.write(HEADER.pack(MAGIC, geometry.rows, geometry.columns, geometry.k))
+
+    def write(self, record: GameRecord) -> None:
+        """Append a record to the file.
+
+        Args:
+            record (GameRecord): The record of the game.
+        """
+        buffer = self._buffer
+        count = len(record.moves)
+        microseconds = min(round(record.elapsed * 1e6), MAX_MICROSECONDS)
+        RECORD_PREFIX.pack_into(buffer, 0, record.first_player, record.outcome, count, microseconds)
+        start = RECORD_PREFIX.size
+        buffer[start:start + count] = bytes(record.moves)
+        buffer[start + count:] = bytes([PADDING]) * (len(buffer) - start - count)
+        self._file.write(buffer)
+        self.count += 1
+
+    def close(self) -> None:
+        """Flush and close the file."""
+        self._file.close()
+
+    def __enter__(self) -> "RecordWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def read_records(path: str) -> Iterator[GameRecord]:
+    """Read the records of a file in order, a batch at a time.
+
+    Args:
+        path (str): The path of the file.
+
+    Yields:
+        GameRecord: The record of each game.
+
+    Raises:
+        ValueError: if the file is not a file of records.
+    """
+    with open(path, "rb") as file:
+        size = record_size(_read_header(file, path))
+        while True:
+            data = file.read(size * READ_BATCH)
+            for offset in range(0, len(data) - size + 1, size):
+                yield _unpack(data, offset)
+            if len(data) < size * READ_BATCH:
+                break
+
+
+class RecordFile:
+    """Memory-mapped file of game records with access by index.
+
+    Attributes
+    ----------
+    path : str
+        The path of the file.
+    geometry : Geometry
+        The lines of the board of the games.
+
+    Methods
+    -------
+    __getitem__(index: int) -> GameRecord
+        Get the record of a game.
+    __len__() -> int
+        Get the number of records.
+    close() -> None
+        Release the memory map of the file.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Open and map the file.
+
+        Args:
+            path (str): The path of the file.
+
+        Raises:
+            ValueError: if the file is not a file of records.
+        """
+        self.path = path
+        with open(path, "rb") as file:
+            self.geometry = _read_header(file, path)
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._size = record_size(self.geometry)
+        self._count = (len(self._map) - HEADER.size) // self._size
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: int) -> GameRecord:
+        """Get the record of a game.
+
+        Args:
+            index (int): The index of the game in the file, negative from the end.
+
+        Returns:
+            GameRecord: The record of the game.
+
+        Raises:
+            IndexError: if there is no game with the index.
+        """
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("game record index out of range")
+        return _unpack(self._map, HEADER.size + index * self._size)
+
+    def close(self) -> None:
+        """Release the memory map of the file."""
+        self._map.close()
+
+    def __enter__(self) -> "RecordFile":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+if __name__ == "__main__":
+    for number, game in enumerate(read_records(sys.argv[1])):
+        print(number, game.first_player, game.outcome, round(game.elapsed * 1e6), *game.moves)
@@ -0,0 +1,317 @@
+"""
+Headless self-play of TicTacToe agents.
+
+Plays many games between two agents without printing anything, spreads the
+games across worker processes and streams one result per game to an output
+file of game records (see records.py). The agents are given by name:
+
+    minimax         The search of the AI, it never loses on the classic board.
+    solved          The AI with the solved table on the classic board.
+    random          A random legal move.
+    epsilon:0.1     A random move with probability 0.1, otherwise the AI move.
+    mcts:2000       The Monte Carlo tree search with 2000 iterations per move.
+
+Run 10000 games of a random player against the AI and check that the AI
+never loses with:
+
+    python selfplay.py --games 10000 --x random --o minimax --output games.ttt --check-never-loses
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from ai import AI, get_shared_table
+from mcts import MCTS
+from position import Board, Geometry, Position, get_geometry
+from records import COMPUTER_WINS, PLAYER_WINS, TIE, GameRecord, RecordWriter
+
+
+# Games played by a worker in each task
+CHUNK_SIZE = 200
+
+
+class RandomAgent:
+    """Agent that plays a random legal move."""
+
+    def __init__(self, rng: random.Random) -> None:
+        """Initialize the agent.
+
+        Args:
+            rng (random.Random): The random generator.
+        """
+        self.rng = rng
+
+    def choose(self, board: Board, player: int) -> int:
+        """Choose a move.
+
+        Args:
+            board (Board): The board, it's not changed.
+            player (int): The player to move, 0 for O and 1 for X.
+
+        Returns:
+            int: The index of the move.
+        """
+        return self.rng.choice(board.possible_moves())
+
+
+class MinimaxAgent:
+    """Agent that plays the move of the AI for either player.
+
+    The move is searched with the AI even on the classic board, so the games
+    test the search, unless the agent is told to read the solved table.
+    """
+
+    def __init__(self, depth: Optional[int] = None, use_solved_table: bool = False) -> None:
+        """Initialize the agent.
+
+        Args:
+            depth (int): The search horizon, the default of the AI if it's None.
+            use_solved_table (bool): True to read the moves of the classic board
+                                     from the solved table instead of searching them.
+        """
+        self.depth = depth
+        self.use_solved_table = use_solved_table
+
+    def choose(self, board: Board, player: int) -> int:
+        """Choose a move.
+
+        Args:
+            board (Board): The board, it's not changed.
+            player (int): The player to move, 0 for O and 1 for X.
+
+        Returns:
+            int: The index of the move.
+        """
+        ai = AI(Position.from_board(board.copy()), get_shared_table(board.geometry),
+                use_solved_table=self.use_solved_table, depth=self.depth)
+        return ai.choose_move(player)
+
+
+class EpsilonGreedyAgent:
+    """Agent that plays a random move with some probability and the AI move otherwise."""
+
+    def __init__(self, epsilon: float, rng: random.Random, depth: Optional[int] = None) -> None:
+        """Initialize the agent.
+
+        Args:
+            epsilon (float): The probability of a random move.
+            rng (random.Random): The random generator.
+            depth (int): The search horizon of the AI moves.
+        """
+        self.epsilon = epsilon
+        self.random_agent = RandomAgent(rng)
+        self.minimax_agent = MinimaxAgent(depth)
+        self.rng = rng
+
+    def choose(self, board: Board, player: int) -> int:
+        """Choose a move.
+
+        Args:
+            board (Board): The board, it's not changed.
+            player (int): The player to move, 0 for O and 1 for X.
+
+        Returns:
+            int: The index of the move.
+        """
+        if self.rng.random() < self.epsilon:
+            return self.random_agent.choose(board, player)
+        return self.minimax_agent.choose(board, player)
+
+
+class MCTSAgent:
+    """Agent that plays the move of the Monte Carlo tree search.
+
+    The engine is kept for the whole game, so the tree of each move is
+    reused in the next one.
+    """
+
+    def __init__(self, iterations: int, rng: random.Random) -> None:
+        """Initialize the agent.
+
+        Args:
+            iterations (int): The iterations of each search.
+            rng (random.Random): The random generator of the seed of the engine.
+        """
+        self.engine = MCTS(Position.from_board(Board()), iterations=iterations,
+                           seed=rng.getrandbits(32))
+
+    def choose(self, board: Board, player: int) -> int:
+        """Choose a move.
+
+        Args:
+            board (Board): The board, it's not changed.
+            player (int): The player to move, 0 for O and 1 for X.
+
+        Returns:
+            int: The index of the move.
+        """
+        self.engine.position = Position.from_board(board.copy())
+        return self.engine.choose_move(player)
+
+
+def make_agent(spec: str, rng: random.Random, depth: Optional[int] = None):
+    """Create an agent from its name.
+
+    Args:
+        spec (str): 'minimax', 'solved', 'random', 'epsilon:<probability>' or 'mcts:<iterations>'.
+        rng (random.Random): The random generator of the agent.
+        depth (int): The search horizon of the AI moves.
+
+    Returns:
+        The agent.
+
+    Raises:
+        ValueError: if the name is unknown.
+    """
+    if spec == "minimax":
+        return MinimaxAgent(depth)
+    if spec == "solved":
+        return MinimaxAgent(depth, use_solved_table=True)
+    if spec == "random":
+        return RandomAgent(rng)
+    if spec.startswith("epsilon:"):
+        return EpsilonGreedyAgent(float(spec.split(":", 1)[1]), rng, depth)
+    if spec.startswith("mcts:"):
+        return MCTSAgent(int(spec.split(":", 1)[1]), rng)
+    raise ValueError(f"Unknown agent: {spec}")
+
+
+def play_game(agents: Tuple[object, object], geometry: Geometry, first_player: int) -> GameRecord:
+    """Play a game between two agents.
+
+    Args:
+        agents (Tuple[object, object]): The agent of O (player 0) and the agent of X (player 1).
+        geometry (Geometry): The lines of the board.
+        first_player (int): The player that moves first.
+
+    Returns:
+        GameRecord: The record of the game.
+    """
+    start = time.perf_counter()
+    board = Board(geometry=geometry)
+    moves = []
+    player = first_player
+    while board.status() is None:
+        move = agents[player].choose(board, player)
+        board.make_move(move, player)
+        moves.append(move)
+        player = 1 - player
+    status = board.status()
+    outcome = TIE if status == "tie" else status
+    return GameRecord(first_player, moves, outcome, time.perf_counter() - start)
+
+
+def play_games(start: int, count: int, o_spec: str, x_spec: str, rows: int, columns: int,
+               k: int, seed: int, depth: Optional[int]) -> List[GameRecord]:
+    """Play a range of games, the first player alternates with the number of the game.
+
+    Args:
+        start (int): The number of the first game.
+        count (int): The number of games.
+        o_spec (str): The name of the agent of O.
+        x_spec (str): The name of the agent of X.
+        rows (int): The number of rows of the board.
+        columns (int): The number of columns of the board.
+        k (int): The number of marks in a row needed to win.
+        seed (int): The seed of the games, each game uses seed + its number.
+        depth (int): The search horizon of the AI moves.
+
+    Returns:
+        List[GameRecord]: The records of the games.
+    """
+    geometry = get_geometry(rows, columns, k)
+    results = []
+    for index in range(start, start + count):
+        rng = random.Random(seed + index)
+        agents = (make_agent(o_spec, rng, depth), make_agent(x_spec, rng, depth))
+        results.append(play_game(agents, geometry, index % 2))
+    return results
+
+
+def run_self_play(games: int, o_spec: str = "minimax", x_spec: str = "random",
+                  rows: int = 3, columns: int = 3, k: int = 3, seed: int = 0,
+                  depth: Optional[int] = None, workers: Optional[int] = None) -> Iterator[GameRecord]:
+    """Play the games across worker processes and yield the records in the order of the games.
+
+    Args:
+        games (int): The number of games.
+        o_spec (str): The name of the agent of O.
+        x_spec (str): The name of the agent of X.
+        rows (int): The number of rows of the board.
+        columns (int): The number of columns of the board.
+        k (int): The number of marks in a row needed to win.
+        seed (int): The seed of the games.
+        depth (int): The search horizon of the AI moves.
+        workers (int): The number of worker processes, by default the number of CPUs.
+
+    Yields:
+        GameRecord: The record of each game.
+    """
+    # Check the names before starting the workers
+    make_agent(o_spec, random.Random(), depth)
+    make_agent(x_spec, random.Random(), depth)
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        futures = [executor.submit(play_games, start, min(CHUNK_SIZE, games - start), o_spec,
+                                   x_spec, rows, columns, k, seed, depth)
+                   for start in range(0, games, CHUNK_SIZE)]
+        # The workers keep playing while the first chunks are written
+        for future in futures:
+            yield from future.result()
+
+
+def main() -> int:
+    """Run the self-play from the command line.
+
+    Returns:
+        int: 1 if the check of the AI failed, 0 otherwise.
+    """
+    parser = argparse.ArgumentParser(description="Headless self-play of TicTacToe agents")
+    parser.add_argument("--games", type=int, default=1000, help="number of games")
+    parser.add_argument("--o", default="minimax", help="agent of O: minimax, solved, random, epsilon:<p> or mcts:<n>")
+    parser.add_argument("--x", default="random", help="agent of X: minimax, solved, random, epsilon:<p> or mcts:<n>")
+    parser.add_argument("--rows", type=int, default=3)
+    parser.add_argument("--columns", type=int, default=3)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--depth", type=int, default=None, help="search horizon of the AI")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes")
+    parser.add_argument("--output", default=None, help="file for the record of each game")
+    parser.add_argument("--check-never-loses", action="store_true",
+                        help="fail if a minimax agent loses a game")
+    arguments = parser.parse_args()
+
+    counts: Dict[int, int] = {COMPUTER_WINS: 0, PLAYER_WINS: 0, TIE: 0}
+    losses = 0
+    geometry = get_geometry(arguments.rows, arguments.columns, arguments.k)
+    output = RecordWriter(arguments.output, geometry) if arguments.output else None
+    start = time.perf_counter()
+    try:
+        for result in run_self_play(arguments.games, arguments.o, arguments.x, arguments.rows,
+                                    arguments.columns, arguments.k, arguments.seed,
+                                    arguments.depth, arguments.workers):
+            counts[result.outcome] += 1
+            if ((arguments.o == "minimax" and result.outcome == PLAYER_WINS)
+                    or (arguments.x == "minimax" and result.outcome == COMPUTER_WINS)):
+                losses += 1
+            if output is not None:
+                output.write(result)
+    finally:
+        if output is not None:
+            output.close()
+    elapsed = time.perf_counter() - start
+
+    print(f"{arguments.games} games in {elapsed:.2f}s ({arguments.games / elapsed:.0f} games/s): "
+          f"O wins {counts[COMPUTER_WINS]}, X wins {counts[PLAYER_WINS]}, ties {counts[TIE]}")
+    if arguments.check_never_loses:
+        print(f"Games lost by minimax: {losses}")
+        return 1 if losses else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,426 @@
+"""
+Headless TicTacToe server for many concurrent games.
+
+The games are kept in memory by session id and the clients talk with the
+server over TCP or a Unix socket with one JSON object per line. Each request
+has an "op" field and the server answers with one line for each request:
+
+    {"op": "new", "rows": 3, "columns": 3, "k": 3, "ai_first": false}
+    {"op": "move", "session": "...", "column": 2, "row": 2}
+    {"op": "state", "session": "..."}
+    {"op": "close", "session": "..."}
+    {"op": "stats"}
+
+The answers have "ok": true with the session, the board (null for empty
+squares, 0 for O and 1 for X), the status (null, 0, 1 or "tie") and the
+move of the AI, or "ok": false with an "error" message. An "id" field in a
+request is copied to its answer. The answer of "stats" has the counters of
+the move service.
+
+The moves of the AI run in an executor, so the event loop is never blocked
+by a search. They go through a MoveService, so the games that ask for the
+move of the same board at the same time share one search and the moves are
+cached. Start the server with:
+
+    python server.py --port 8765
+    python server.py --unix /tmp/tictactoe.sock
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from game import Game
+from move_service import MoveService
+
+
+# Largest number of rows or columns of the games of the server
+MAX_BOARD_SIDE = 15
+
+
+class ProtocolError(Exception):
+    """Raised when a request is not valid, the message is sent to the client."""
+
+
+class Session:
+    """Game of a client kept in the server.
+
+    Attributes
+    ----------
+    session_id : str
+        The id of the session.
+    game : Game
+        The game of the session.
+    last_active : float
+        The monotonic time of the last request of the session.
+    lock : asyncio.Lock
+        Serialize the moves of the session.
+    """
+
+    def __init__(self, session_id: str, game: Game) -> None:
+        """Initialize a new session.
+
+        Args:
+            session_id (str): The id of the session.
+            game (Game): The game of the session.
+        """
+        self.session_id = session_id
+        self.game = game
+        self.last_active = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def touch(self) -> None:
+        """Mark the session as active now."""
+        self.last_active = time.monotonic()
+
+    def state(self) -> Dict[str, Any]:
+        """Get the state of the game to send to the client."""
+        position = self.game.position
+        return {
+            "session": self.session_id,
+            "board": position.board.to_list(),
+            "status": position.board.status(),
+        }
+
+
+class GameServer:
+    """Serve many TicTacToe games over line-delimited JSON.
+
+    Attributes
+    ----------
+    sessions : Dict[str, Session]
+        The games in memory by session id.
+    max_sessions : int
+        The maximum number of games in memory, new games are rejected after it.
+    idle_timeout : float
+        The seconds without requests after which a session is evicted.
+    max_pending_moves : int
+        The maximum number of AI moves waiting or running in the executor, the
+        moves after it are rejected until the server is less busy.
+    max_board_side : int
+        The maximum number of rows and columns of a new game.
+    move_service : MoveService
+        The searches and the cache of the AI moves of all the sessions.
+
+    Methods
+    -------
+    handle_request(request: Dict[str, Any]) -> Dict[str, Any]
+        Execute a request and get the answer.
+    evict_idle_sessions() -> int
+        Remove the sessions without requests for longer than the idle timeout.
+    start_tcp(host: str, port: int) -> asyncio.AbstractServer
+        Start listening on a TCP port.
+    start_unix(path: str) -> asyncio.AbstractServer
+        Start listening on a Unix socket.
+    close() -> None
+        Stop the eviction task and the executor.
+    """
+
+    def __init__(self, executor: Optional[Executor] = None, max_sessions: int = 10_000,
+                 idle_timeout: float = 300.0, max_pending_moves: int = 1_000,
+                 max_line_length: int = 4096, move_service: Optional[MoveService] = None,
+                 max_board_side: int = MAX_BOARD_SIDE) -> None:
+        """Initialize the server without listening yet.
+
+        Args:
+            executor (Executor): The executor of the AI moves, by default a thread pool.
+            max_sessions (int): The maximum number of games in memory.
+            idle_timeout (float): The seconds without requests after which a session is evicted.
+            max_pending_moves (int): The maximum number of AI moves in the executor.
+            max_line_length (int): The maximum length in bytes of a request.
+            move_service (MoveService): The searches and the cache of the AI moves, 
+                                        by default a new service.
+            max_board_side (int): The maximum number of rows and columns of a new game.
+        """
+        self.sessions: Dict[str, Session] = {}
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.max_pending_moves = max_pending_moves
+        self.max_line_length = max_line_length
+        self.max_board_side = max_board_side
+        self._executor = executor if executor is not None else ThreadPoolExecutor()
+        self.move_service = move_service if move_service is not None else MoveService()
+        self._pending_moves = 0
+        self._eviction_task: Optional[asyncio.Task] = None
+
+    async def handle_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute a request and get the answer.
+
+        Args:
+            request (Dict[str, Any]): The request of the client.
+
+        Returns:
+            Dict[str, Any]: The answer for the client.
+        """
+        try:
+            if not isinstance(request, dict):
+                raise ProtocolError("The request must be a JSON object")
+            op = request.get("op")
+            if op == "new":
+                answer = await self._new_game(request)
+            elif op == "move":
+                answer = await self._move(request)
+            elif op == "state":
+                session = self._get_session(request)
+                answer = session.state()
+            elif op == "close":
+                session = self._get_session(request)
+                del self.sessions[session.session_id]
+                answer = {"session": session.session_id}
+            elif op == "stats":
+                answer = self.move_service.metrics()
+            else:
+                raise ProtocolError(f"Unknown op: {op}")
+            answer["ok"] = True
+        except ProtocolError as error:
+            answer = {"ok": False, "error": str(error)}
+        except Exception as error:
+            # A request that fails in an unexpected way doesn't close the connection
+            answer = {"ok": False, "error": f"Internal error: {type(error).__name__}"}
+        if isinstance(request, dict) and "id" in request:
+            answer["id"] = request["id"]
+        return answer
+
+    async def _new_game(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a session with a new game.
+
+        Args:
+            request (Dict[str, Any]): The request with the size of the board and who starts.
+
+        Returns:
+            Dict[str, Any]: The state of the new game.
+
+        Raises:
+            ProtocolError: if there are too many sessions or the board is not valid.
+        """
+        if len(self.sessions) >= self.max_sessions:
+            self.evict_idle_sessions()
+            if len(self.sessions) >= self.max_sessions:
+                raise ProtocolError("Too many sessions, try again later")
+        try:
+            rows = int(request.get("rows", 3))
+            columns = int(request.get("columns", 3))
+            k = int(request.get("k", 3))
+        except (TypeError, ValueError) as error:
+            raise ProtocolError(f"Invalid board: {error}")
+        # Each size of board is built once and kept in memory, so the sizes are limited
+        if not (1 <= rows <= self.max_board_side and 1 <= columns <= self.max_board_side):
+            raise ProtocolError(f"The board can have at most {self.max_board_side} rows and columns")
+        try:
+            # The lines of a new board size take time to build, so they're built 
+            # outside the event loop, in a thread even if the AI runs in processes
+            game = await asyncio.get_running_loop().run_in_executor(None, Game, rows, columns, k)
+        except ValueError as error:
+            raise ProtocolError(f"Invalid board: {error}")
+
+        session = Session(uuid.uuid4().hex, game)
+        self.sessions[session.session_id] = session
+        ai_move = None
+        if request.get("ai_first", False):
+            async with session.lock:
+                ai_move = await self._ai_move(session)
+        answer = session.state()
+        answer["ai_move"] = ai_move
+        return answer
+
+    async def _move(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Make the move of the player and the answer of the AI.
+
+        Args:
+            request (Dict[str, Any]): The request with the session, the column and the row.
+
+        Returns:
+            Dict[str, Any]: The state of the game after both moves.
+
+        Raises:
+            ProtocolError: if the session doesn't exist or the move is not valid.
+        """
+        session = self._get_session(request)
+        async with session.lock:
+            game = session.game
+            if game.position.game_over:
+                raise ProtocolError("The game is finished")
+            try:
+                column = int(request["column"])
+                row = int(request["row"])
+            except (KeyError, TypeError, ValueError):
+                raise ProtocolError("The move needs an integer column and row")
+            if not game.make_move_player(column, row):
+                raise ProtocolError("The position is outside the board or already occupied")
+
+            ai_move = None
+            if not game.position.game_over:
+                ai_move = await self._ai_move(session)
+        answer = session.state()
+        answer["ai_move"] = ai_move
+        return answer
+
+    async def _ai_move(self, session: Session) -> Optional[int]:
+        """Search the move of the AI in the executor and make it.
+
+        Args:
+            session (Session): The session, its lock must be held.
+
+        Returns:
+            int: The index of the move of the AI.
+
+        Raises:
+            ProtocolError: if there are too many AI moves waiting.
+        """
+        if self._pending_moves >= self.max_pending_moves:
+            raise ProtocolError("The server is busy, try again later")
+        self._pending_moves += 1
+        try:
+            move = await self.move_service.get_move_async(session.game.position.board, self._executor)
+        finally:
+            self._pending_moves -= 1
+        if move is not None:
+            session.game.position.make_move(move, 0)
+        session.touch()
+        return move
+
+    def _get_session(self, request: Dict[str, Any]) -> Session:
+        """Get the session of a request and mark it as active.
+
+        Args:
+            request (Dict[str, Any]): The request with the session id.
+
+        Returns:
+            Session: The session.
+
+        Raises:
+            ProtocolError: if the session doesn't exist.
+        """
+        session_id = request.get("session")
+        if not isinstance(session_id, str):
+            raise ProtocolError("The session must be a string")
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise ProtocolError("Unknown session")
+        session.touch()
+        return session
+
+    def evict_idle_sessions(self) -> int:
+        """Remove the sessions without requests for longer than the idle timeout.
+
+        Returns:
+            int: The number of sessions removed.
+        """
+        limit = time.monotonic() - self.idle_timeout
+        idle = [session_id for session_id, session in self.sessions.items()
+                if session.last_active < limit and not session.lock.locked()]
+        for session_id in idle:
+            del self.sessions[session_id]
+        return len(idle)
+
+    async def _evict_periodically(self) -> None:
+        """Evict the idle sessions until the task is cancelled."""
+        while True:
+            await asyncio.sleep(max(self.idle_timeout / 4, 1.0))
+            self.evict_idle_sessions()
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Answer the requests of a connection, one line for each request.
+
+        The next request isn't read until the answer is sent, so a client that
+        doesn't read its answers stops being served instead of filling the memory.
+
+        Args:
+            reader (asyncio.StreamReader): The requests of the client.
+            writer (asyncio.StreamWriter): The answers for the client.
+        """
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # The line is longer than the limit of the reader
+                    answer = {"ok": False, "error": "The request is too long"}
+                    writer.write(json.dumps(answer).encode() + b"\n")
+                    break
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except json.JSONDecodeError:
+                    answer = {"ok": False, "error": "The request is not valid JSON"}
+                else:
+                    answer = await self.handle_request(request)
+                writer.write(json.dumps(answer).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def _start_eviction(self) -> None:
+        """Start the eviction task if it's not running."""
+        if self._eviction_task is None:
+            self._eviction_task = asyncio.get_running_loop().create_task(self._evict_periodically())
+
+    async def start_tcp(self, host: str = "127.0.0.1", port: int = 8765) -> asyncio.AbstractServer:
+        """Start listening on a TCP port.
+
+        Args:
+            host (str): The address to listen on.
+            port (int): The port to listen on.
+
+        Returns:
+            asyncio.AbstractServer: The listening server.
+        """
+        self._start_eviction()
+        return await asyncio.start_server(self._handle_client, host, port, limit=self.max_line_length)
+
+    async def start_unix(self, path: str) -> asyncio.AbstractServer:
+        """Start listening on a Unix socket.
+
+        Args:
+            path (str): The path of the socket.
+
+        Returns:
+            asyncio.AbstractServer: The listening server.
+        """
+        self._start_eviction()
+        return await asyncio.start_unix_server(self._handle_client, path, limit=self.max_line_length)
+
+    def close(self) -> None:
+        """Stop the eviction task and the executor."""
+        if self._eviction_task is not None:
+            self._eviction_task.cancel()
+            self._eviction_task = None
+        self._executor.shutdown(wait=False)
+
+
+async def serve(host: str, port: int, unix_path: Optional[str]) -> None:
+    """Run the server until it's interrupted.
+
+    Args:
+        host (str): The address to listen on.
+        port (int): The port to listen on.
+        unix_path (str): The path of the Unix socket, None to listen on TCP.
+    """
+    game_server = GameServer()
+    if unix_path is not None:
+        server = await game_server.start_unix(unix_path)
+    else:
+        server = await game_server.start_tcp(host, port)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        game_server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless TicTacToe server")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port to listen on")
+    parser.add_argument("--unix", default=None, help="path of a Unix socket to listen on instead of TCP")
+    arguments = parser.parse_args()
+    try:
+        asyncio.run(serve(arguments.host, arguments.port, arguments.unix))
+    except KeyboardInterrupt:
+        pass
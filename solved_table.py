@@ -0,0 +1,274 @@
+"""
+Perfect play table of every TicTacToe board.
+
+The table is built once by retrograde analysis: the boards are solved from
+the full ones to the empty one, so the children of a board are always solved
+before it. The result is written in a binary file that is memory-mapped by the
+AI to answer a move with a single lookup.
+
+Build the file with:
+
+    python solved_table.py
+"""
+import mmap
+import os
+import struct
+from typing import List, Optional
+
+from position import Board
+
+
+# Path of the file shipped with the game
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "solved_table.bin")
+
+MAGIC = b"TTTSOLV1"
+HEADER = struct.Struct("<8sI")
+# Value of the board, bits of the best moves, plies to the end and flags
+RECORD = struct.Struct("<hHBB")
+TERMINAL_FLAG = 1
+
+BOARD_CODES = 3 ** 9
+RECORD_COUNT = BOARD_CODES * 2
+
+# Base 3 code of the bits of the computer, the code of the human player is the double
+TERNARY = [0] * 512
+for _bits in range(1, 512):
+    _lowest = _bits & -_bits
+    TERNARY[_bits] = TERNARY[_bits ^ _lowest] + 3 ** (_lowest.bit_length() - 1)
+TERNARY = tuple(TERNARY)
+
+
+def board_code(board: Board) -> int:
+    """Get the base 3 code of a board.
+
+    The square i is the digit i of the code: 0 if it's empty, 1 for the
+    computer (O) and 2 for the human player (X).
+
+    Args:
+        board (Board): The board.
+
+    Returns:
+        int: The code between 0 and 3^9 - 1.
+    """
+    return TERNARY[board.o_bits] + 2 * TERNARY[board.x_bits]
+
+
+def record_index(board: Board, player: int) -> int:
+    """Get the index of the record of a board.
+
+    Args:
+        board (Board): The board.
+        player (int): The player to move, 0 for the computer and 1 for the human player.
+
+    Returns:
+        int: The index of the record in the table.
+    """
+    return board_code(board) * 2 + player
+
+
+class SolvedEntry:
+    """Solution of a board.
+
+    Attributes
+    ----------
+    value : int
+        The minimax evaluation of the board with perfect play.
+    moves : List[int]
+        All the moves that keep the value, in ascending order.
+    distance : int
+        The number of plies to the end of the game playing the first move.
+    terminal : bool
+        True if the game is finished in the board.
+    """
+
+    __slots__ = ("value", "moves", "distance", "terminal")
+
+    def __init__(self, value: int, moves: List[int], distance: int, terminal: bool) -> None:
+        """Initialize the solution of a board.
+
+        Args:
+            value (int): The minimax evaluation of the board.
+            moves (List[int]): All the moves that keep the value.
+            distance (int): The number of plies to the end of the game.
+            terminal (bool): True if the game is finished in the board.
+        """
+        self.value = value
+        self.moves = moves
+        self.distance = distance
+        self.terminal = terminal
+
+    @property
+    def best_move(self) -> Optional[int]:
+        """Get the move that the AI plays, the first of the best moves."""
+        return self.moves[0] if self.moves else None
+
+
+def _mask_to_moves(mask: int) -> List[int]:
+    """Get the squares of a bit mask in ascending order."""
+    return [square for square in range(9) if mask >> square & 1]
+
+
+def solve() -> bytearray:
+    """Solve every board by retrograde analysis.
+
+    Returns:
+        bytearray: The records of the table, one for each board and player to move.
+    """
+    records = bytearray(RECORD_COUNT * RECORD.size)
+    values = [0] * RECORD_COUNT
+    distances = [0] * RECORD_COUNT
+
+    # Group the boards by the number of empty squares
+    boards_by_empty: List[List[Board]] = [[] for _ in range(10)]
+    for o_bits in range(512):
+        for x_bits in range(512):
+            if o_bits & x_bits == 0:
+                board = Board(o_bits, x_bits)
+                boards_by_empty[board.empty_count()].append(board)
+
+    for boards in boards_by_empty:
+        for board in boards:
+            code = board_code(board)
+            terminal = board.status() is not None
+            for player in (0, 1):
+                index = code * 2 + player
+                if terminal:
+                    value = board.evaluation()
+                    RECORD.pack_into(records, index * RECORD.size, value, 0, 0, TERMINAL_FLAG)
+                    values[index] = value
+                    continue
+
+                best_value = None
+                best_mask = 0
+                distance = 0
+                for move in board.possible_moves():
+                    # The children have one empty square less, so they are already solved
+                    child_index = (code + (player + 1) * 3 ** move) * 2 + 1 - player
+                    child_value = values[child_index]
+                    if (best_value is None
+                            or (player == 0 and child_value > best_value)
+                            or (player == 1 and child_value < best_value)):
+                        best_value = child_value
+                        best_mask = 0
+                        distance = distances[child_index] + 1
+                    if child_value == best_value:
+                        best_mask |= 1 << move
+
+                RECORD.pack_into(records, index * RECORD.size, best_value, best_mask, distance, 0)
+                values[index] = best_value
+                distances[index] = distance
+    return records
+
+
+def build(path: str = DEFAULT_PATH) -> None:
+    """Solve every board and write the table in a binary file.
+
+    Args:
+        path (str): The path of the file.
+    """
+    records = solve()
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, RECORD_COUNT))
+        file.write(records)
+    os.replace(temp_path, path)
+
+
+class SolvedTable:
+    """Memory-mapped table with the solution of every board.
+
+    Attributes
+    ----------
+    path : str
+        The path of the file.
+
+    Methods
+    -------
+    lookup(board: Board, player: int) -> SolvedEntry
+        Get the solution of a board.
+    best_move(board: Board, player: int) -> Optional[int]
+        Get the move that the AI plays in a board.
+    close() -> None
+        Release the memory map of the file.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH) -> None:
+        """Open and map the file of the table.
+
+        Args:
+            path (str): The path of the file.
+
+        Raises:
+            ValueError: if the file is not a valid table.
+        """
+        self.path = path
+        with open(path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) != HEADER.size + RECORD_COUNT * RECORD.size:
+            self._map.close()
+            raise ValueError(f"Invalid size of the solved table: {path}")
+        magic, count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or count != RECORD_COUNT:
+            self._map.close()
+            raise ValueError(f"Invalid header of the solved table: {path}")
+
+    def lookup(self, board: Board, player: int) -> SolvedEntry:
+        """Get the solution of a board.
+
+        Args:
+            board (Board): The board.
+            player (int): The player to move, 0 for the computer and 1 for the human player.
+
+        Returns:
+            SolvedEntry: The solution of the board.
+        """
+        offset = HEADER.size + record_index(board, player) * RECORD.size
+        value, mask, distance, flags = RECORD.unpack_from(self._map, offset)
+        return SolvedEntry(value, _mask_to_moves(mask), distance, bool(flags & TERMINAL_FLAG))
+
+    def best_move(self, board: Board, player: int) -> Optional[int]:
+        """Get the move that the AI plays in a board.
+
+        Args:
+            board (Board): The board.
+            player (int): The player to move, 0 for the computer and 1 for the human player.
+
+        Returns:
+            int: The first of the best moves.
+            None: If the game is finished.
+        """
+        offset = HEADER.size + record_index(board, player) * RECORD.size
+        mask = RECORD.unpack_from(self._map, offset)[1]
+        if mask == 0:
+            return None
+        return (mask & -mask).bit_length() - 1
+
+    def close(self) -> None:
+        """Release the memory map of the file."""
+        self._map.close()
+
+
+_default_table: Optional[SolvedTable] = None
+_default_loaded = False
+
+
+def default_table() -> Optional[SolvedTable]:
+    """Get the table shipped with the game, it's opened only once in the process.
+
+    Returns:
+        SolvedTable: The table if the file exists and it's valid.
+        None: If the file is missing or invalid.
+    """
+    global _default_table, _default_loaded
+    if not _default_loaded:
+        _default_loaded = True
+        try:
+            _default_table = SolvedTable(DEFAULT_PATH)
+        except (OSError, ValueError):
+            _default_table = None
+    return _default_table
+
+
+if __name__ == "__main__":
+    build()
+    print(f"Solved table written in {DEFAULT_PATH}")
@@ -0,0 +1,338 @@
+"""Transposition table of the positions already searched by the AI"""
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from position import CLASSIC, Board, Geometry
+
+
+# Flags of the value stored in an entry
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+# The 8 rotations and reflections of the board, each one maps the
+# square i of the transformed board to a square of the original board
+SYMMETRIES: Tuple[Tuple[int, ...], ...] = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8),  # Identity
+    (6, 3, 0, 7, 4, 1, 8, 5, 2),  # Rotation 90
+    (8, 7, 6, 5, 4, 3, 2, 1, 0),  # Rotation 180
+    (2, 5, 8, 1, 4, 7, 0, 3, 6),  # Rotation 270
+    (2, 1, 0, 5, 4, 3, 8, 7, 6),  # Vertical reflection
+    (6, 7, 8, 3, 4, 5, 0, 1, 2),  # Horizontal reflection
+    (0, 3, 6, 1, 4, 7, 2, 5, 8),  # Main diagonal reflection
+    (8, 5, 2, 7, 4, 1, 6, 3, 0),  # Anti diagonal reflection
+)
+
+
+def _build_symmetry_table(symmetry: Tuple[int, ...]) -> List[int]:
+    """Map every 9-bit player mask to the mask after the symmetry.
+
+    Args:
+        symmetry (Tuple[int, ...]): The squares of the original board.
+
+    Returns:
+        List[int]: The transformed mask of each one of the 512 masks.
+    """
+    # Square of the transformed board where each original square goes
+    target = [0] * 9
+    for square, source in enumerate(symmetry):
+        target[source] = square
+    # Each mask is the mask without its lowest bit plus the square of that bit
+    table = [0] * 512
+    for bits in range(1, 512):
+        lowest = bits & -bits
+        table[bits] = table[bits ^ lowest] | 1 << target[lowest.bit_length() - 1]
+    return table
+
+
+SYMMETRY_TABLES = tuple(_build_symmetry_table(symmetry) for symmetry in SYMMETRIES)
+
+# Symmetries of each board size and their tables of bytes, built on first use
+_byte_tables: Dict[Geometry, Tuple[List[List[int]], List[List[List[int]]]]] = {}
+
+
+def canonical_key(board: Board, maximizing_player: bool) -> int:
+    """Get the key shared by the 8 symmetric boards with the same player to move.
+
+    Only the classic board is folded by its symmetries, other boards use 
+    the code of the board itself.
+
+    Args:
+        board (Board): The board.
+        maximizing_player (bool): True if the computer moves next, False otherwise.
+
+    Returns:
+        int: The smallest code of the symmetric boards with the player to move
+             in the lowest bit.
+    """
+    o_bits = board.o_bits
+    x_bits = board.x_bits
+    if board.geometry is not CLASSIC:
+        return (o_bits << board.geometry.size | x_bits) << 1 | maximizing_player
+    key = min(table[o_bits] << 9 | table[x_bits] for table in SYMMETRY_TABLES)
+    return key << 1 | maximizing_player
+
+
+def board_symmetries(geometry: Geometry) -> List[List[int]]:
+    """Get the rotations and reflections that keep the lines of a board.
+
+    A square board has 8, a rectangular board 4 (no rotation by 90 degrees).
+
+    Args:
+        geometry (Geometry): The lines of the board.
+
+    Returns:
+        List[List[int]]: The square where each square goes for each symmetry.
+    """
+    rows = geometry.rows
+    columns = geometry.columns
+    transforms: List[Callable[[int, int], Tuple[int, int]]] = [
+        lambda row, column: (row, column),
+        lambda row, column: (rows - 1 - row, columns - 1 - column),
+        lambda row, column: (row, columns - 1 - column),
+        lambda row, column: (rows - 1 - row, column),
+    ]
+    if rows == columns:
+        transforms += [
+            lambda row, column: (column, row),
+            lambda row, column: (columns - 1 - column, rows - 1 - row),
+            lambda row, column: (column, rows - 1 - row),
+            lambda row, column: (columns - 1 - column, row),
+        ]
+    result = []
+    for transform in transforms:
+        targets = []
+        for square in range(geometry.size):
+            row, column = transform(*divmod(square, columns))
+            targets.append(row * columns + column)
+        result.append(targets)
+    return result
+
+
+def _build_byte_tables(geometry: Geometry) -> List[List[List[int]]]:
+    """Map every byte of a player mask to its bits after each symmetry.
+
+    Args:
+        geometry (Geometry): The lines of the board.
+
+    Returns:
+        List[List[List[int]]]: For each symmetry and each byte of the mask the
+            transformed bits of the 256 values of the byte.
+    """
+    tables = []
+    for targets in board_symmetries(geometry):
+        chunks = []
+        for start in range(0, geometry.size, 8):
+            chunk = [0] * 256
+            for value in range(1, 256):
+                lowest = value & -value
+                square = start + lowest.bit_length() - 1
+                bit = 1 << targets[square] if square < geometry.size else 0
+                chunk[value] = chunk[value ^ lowest] | bit
+            chunks.append(chunk)
+        tables.append(chunks)
+    return tables
+
+
+def canonical_board(board: Board) -> Tuple[int, List[int]]:
+    """Get the code shared by a board and its rotations and reflections.
+
+    It works with any board size, the rectangular boards have 4 symmetries.
+
+    Args:
+        board (Board): The board.
+
+    Returns:
+        Tuple[int, List[int]]: The smallest code of the symmetric boards, with 
+            the computer in the high bits, and the square where each square 
+            of the board goes in the board of that code.
+    """
+    geometry = board.geometry
+    tables = _byte_tables.get(geometry)
+    if tables is None:
+        tables = _byte_tables[geometry] = (board_symmetries(geometry), _build_byte_tables(geometry))
+    size = geometry.size
+    best = best_targets = None
+    for targets, chunks in zip(*tables):
+        o_bits = board.o_bits
+        x_bits = board.x_bits
+        o_code = x_code = 0
+        for chunk in chunks:
+            o_code |= chunk[o_bits & 255]
+            x_code |= chunk[x_bits & 255]
+            o_bits >>= 8
+            x_bits >>= 8
+        code = o_code << size | x_code
+        if best is None or code < best:
+            best = code
+            best_targets = targets
+    return best, best_targets
+
+
+class TableEntry:
+    """Result of a search stored in the transposition table.
+
+    Attributes
+    ----------
+    key : int
+        The canonical key of the position.
+    depth : int
+        The depth searched from the position.
+    value : float
+        The evaluation of the position.
+    flag : int
+        EXACT, LOWER_BOUND or UPPER_BOUND.
+    """
+
+    __slots__ = ("key", "depth", "value", "flag")
+
+    def __init__(self, key: int, depth: int, value: float, flag: int) -> None:
+        """Initialize a new entry.
+
+        Args:
+            key (int): The canonical key of the position.
+            depth (int): The depth searched from the position.
+            value (float): The evaluation of the position.
+            flag (int): EXACT, LOWER_BOUND or UPPER_BOUND.
+        """
+        self.key = key
+        self.depth = depth
+        self.value = value
+        self.flag = flag
+
+
+class TranspositionTable:
+    """Transposition table of the positions already searched by the AI.
+
+    With the 'lru' replacement the least recently used entry is evicted
+    when the table is full. With the 'depth' replacement each key goes to a
+    fixed slot and an entry is only replaced by a search of the same or
+    greater depth.
+
+    Attributes
+    ----------
+    max_size : int
+        The maximum number of entries.
+    replacement : str
+        The eviction policy, 'lru' or 'depth'.
+    hits : int
+        The number of lookups that found an entry.
+    misses : int
+        The number of lookups that didn't find an entry.
+    evictions : int
+        The number of entries replaced or removed to make room.
+
+    Methods
+    -------
+    lookup(key: int) -> Optional[TableEntry]
+        Get the entry of a position.
+    store(key: int, depth: int, value: float, flag: int) -> None
+        Save the result of a search.
+    flush() -> None
+        Save the new entries, used by the tables stored in a file.
+    clear() -> None
+        Remove all the entries and reset the counters.
+    """
+
+    def __init__(self, max_size: int = 100_000, replacement: str = "lru") -> None:
+        """Initialize an empty table.
+
+        Args:
+            max_size (int): The maximum number of entries.
+            replacement (str): The eviction policy, 'lru' or 'depth'.
+
+        Raises:
+            ValueError: if the size is not positive or the policy is unknown.
+        """
+        if max_size < 1:
+            raise ValueError("The size of the table must be positive")
+        if replacement not in ("lru", "depth"):
+            raise ValueError(f"Unknown replacement policy: {replacement}")
+        self.max_size = max_size
+        self.replacement = replacement
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size = 0
+        self._entries: "OrderedDict[int, TableEntry]" = OrderedDict()
+        self._slots: List[Optional[TableEntry]] = []
+        if replacement == "depth":
+            self._slots = [None] * max_size
+
+    def lookup(self, key: int) -> Optional[TableEntry]:
+        """Get the entry of a position.
+
+        Args:
+            key (int): The canonical key of the position.
+
+        Returns:
+            TableEntry: The entry if the position is in the table.
+            None: If the position isn't in the table.
+        """
+        if self.replacement == "lru":
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        else:
+            entry = self._slots[key % self.max_size]
+            if entry is not None and entry.key != key:
+                entry = None
+
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def store(self, key: int, depth: int, value: float, flag: int) -> None:
+        """Save the result of a search.
+
+        Args:
+            key (int): The canonical key of the position.
+            depth (int): The depth searched from the position.
+            value (float): The evaluation of the position.
+            flag (int): EXACT, LOWER_BOUND or UPPER_BOUND.
+        """
+        entry = TableEntry(key, depth, value, flag)
+        if self.replacement == "lru":
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            elif len(self._entries) >= self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._entries[key] = entry
+        else:
+            index = key % self.max_size
+            current = self._slots[index]
+            if current is None:
+                self._slots[index] = entry
+                self._size += 1
+            elif current.key == key or depth >= current.depth:
+                if current.key != key:
+                    self.evictions += 1
+                self._slots[index] = entry
+
+    def flush(self) -> None:
+        """Save the new entries, the table in memory has nothing to save."""
+
+    @property
+    def hit_rate(self) -> float:
+        """Get the fraction of the lookups that found an entry."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def clear(self) -> None:
+        """Remove all the entries and reset the counters."""
+        self._entries.clear()
+        if self.replacement == "depth":
+            self._slots = [None] * self.max_size
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        """Get the number of entries in the table."""
+        if self.replacement == "lru":
+            return len(self._entries)
+        return self._size
@@ -0,0 +1,155 @@
+"""
+Validation of the search algorithms of the AI on the classic board.
+
+Every position reachable from the empty board, with either player to move, is
+searched until the end of the game with the plain alpha-beta, the principal
+variation search and MTD(f). The values must match the solved table and the
+moves must be among its best moves. Each search starts with an empty
+transposition table, so the nodes visited can be compared. The nodes are also
+compared on bigger boards searched to a fixed depth:
+
+    python validate_search.py
+"""
+import argparse
+import sys
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from ai import AI
+from position import Board, Position, get_geometry
+from solved_table import SolvedTable, default_table
+from transposition import TranspositionTable
+
+
+ALGORITHMS = ("alphabeta", "pvs", "mtdf")
+# Boards bigger than 3x3 and the depth of their search, the human player moves first
+LARGE_BOARDS = [((4, 4, 3), 7), ((4, 4, 4), 7), ((5, 5, 4), 5), ((6, 6, 4), 4)]
+
+
+def reachable_boards() -> Iterator[Tuple[Board, int]]:
+    """Get every unfinished board reachable from the empty board.
+
+    Yields:
+        Tuple[Board, int]: The board and the player to move.
+    """
+    seen = set()
+    stack = [(0, 0, 0), (0, 0, 1)]
+    while stack:
+        o_bits, x_bits, player = stack.pop()
+        if (o_bits, x_bits, player) in seen:
+            continue
+        seen.add((o_bits, x_bits, player))
+        board = Board(o_bits, x_bits)
+        if board.status() is not None:
+            continue
+        yield board, player
+        for move in board.possible_moves():
+            board.make_move(move, player)
+            stack.append((board.o_bits, board.x_bits, 1 - player))
+            board.undo_move(move, player)
+
+
+def search(board: Board, player: int, algorithm: str, depth: Optional[int] = None) -> Tuple[float, int, int]:
+    """Search a board with an empty transposition table.
+
+    Args:
+        board (Board): The board, it's not changed.
+        player (int): The player to move.
+        algorithm (str): 'alphabeta', 'pvs' or 'mtdf'.
+        depth (int): The depth of the search, until the end of the game if it's None.
+
+    Returns:
+        Tuple[float, int, int]: The value, the best move and the nodes visited.
+    """
+    ai = AI(Position.from_board(board.copy()), table=TranspositionTable(), use_solved_table=False,
+            depth=depth, null_window=algorithm != "alphabeta", use_mtdf=algorithm == "mtdf")
+    move = ai.choose_move(player)
+    return ai.last_stats.value, move, ai.nodes
+
+
+def validate(solved: SolvedTable) -> Tuple[int, Dict[str, int], List[str]]:
+    """Search every reachable board with all the algorithms and check the results.
+
+    Args:
+        solved (SolvedTable): The solution of the boards.
+
+    Returns:
+        Tuple[int, Dict[str, int], List[str]]: The boards searched, the nodes
+            visited by each algorithm and the errors found.
+    """
+    nodes = {algorithm: 0 for algorithm in ALGORITHMS}
+    errors = []
+    count = 0
+    for board, player in reachable_boards():
+        count += 1
+        entry = solved.lookup(board, player)
+        for algorithm in ALGORITHMS:
+            value, move, visited = search(board, player, algorithm)
+            nodes[algorithm] += visited
+            if value != entry.value or move not in entry.moves:
+                errors.append(f"{algorithm} o={board.o_bits} x={board.x_bits} player={player}: "
+                              f"value {value} move {move}, expected value {entry.value} "
+                              f"moves {entry.moves}")
+    return count, nodes, errors
+
+
+def compare_large_boards() -> List[Tuple[str, Dict[str, Tuple[float, int]]]]:
+    """Search the first move of the computer on bigger boards with all the algorithms.
+
+    Returns:
+        List[Tuple[str, Dict[str, Tuple[float, int]]]]: The name of each board and
+            the value and the nodes visited by each algorithm.
+    """
+    results = []
+    for (rows, columns, k), depth in LARGE_BOARDS:
+        geometry = get_geometry(rows, columns, k)
+        board = Board(geometry=geometry)
+        board.make_move(geometry.size // 2 - 1, 1)
+        searches = {}
+        for algorithm in ALGORITHMS:
+            value, _, nodes = search(board, 0, algorithm, depth)
+            searches[algorithm] = (value, nodes)
+        results.append((f"{rows}x{columns} k={k} depth {depth}", searches))
+    return results
+
+
+def _report(nodes: Dict[str, int]) -> str:
+    """Format the nodes of each algorithm relative to the plain alpha-beta."""
+    return ", ".join(f"{algorithm} {nodes[algorithm]} ({nodes[algorithm] / nodes['alphabeta']:.1%})"
+                     for algorithm in ALGORITHMS)
+
+
+def main() -> int:
+    """Run the validation from the command line.
+
+    Returns:
+        int: 1 if a search doesn't match the solved table, 0 otherwise.
+    """
+    parser = argparse.ArgumentParser(description="Validate the search algorithms of the AI")
+    parser.add_argument("--max-errors", type=int, default=10, help="errors printed")
+    parser.add_argument("--skip-large", action="store_true", help="don't compare bigger boards")
+    arguments = parser.parse_args()
+
+    solved = default_table()
+    if solved is None:
+        print("The solved table is missing, build it with: python solved_table.py")
+        return 1
+    start = time.perf_counter()
+    count, nodes, errors = validate(solved)
+    print(f"{count} positions in {time.perf_counter() - start:.2f}s, nodes: {_report(nodes)}")
+    for error in errors[:arguments.max_errors]:
+        print(error)
+    print(f"{len(errors)} errors")
+
+    if not arguments.skip_large:
+        for name, searches in compare_large_boards():
+            values = {value for value, _ in searches.values()}
+            if len(values) > 1:
+                errors.append(name)
+            print(f"{name}: value {' / '.join(str(value) for value in values)}, nodes: "
+                  f"{_report({algorithm: nodes for algorithm, (_, nodes) in searches.items()})}")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())